@@ -3,6 +3,11 @@ Author: Aaron Ho
 Python Version: 3.7
 """
 
+import json
+import os
+import threading
+import time
+
 import dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
@@ -12,9 +17,12 @@ from dash.dependencies import Input, Output, State, ALL
 from dash.exceptions import PreventUpdate
 from pathlib import Path
 
-from scripts.path_finder import mma_math
-from scripts.stat_finder import *
-from scripts.visual import *
+from scripts.name_cache import cached_payload
+from scripts.name_index import NameIndex
+from scripts.name_search import NameSearch
+from scripts.path_finder import load_win_graph, mma_math
+from scripts.record_store import STORE_FILE
+from scripts.search_jobs import JobManager
 
 FONT_AWESOME = "https://use.fontawesome.com/releases/v5.14.0/css/all.css"
 
@@ -24,10 +32,93 @@ app = dash.Dash(__name__,
 # Data
 
 path = Path(__file__).parent
-name_db = pd.read_csv((path / "data/urls/name_url.tsv"),
-                      sep='\t', header=None, names=['name', 'link'])
+NAME_URLS = path / "data/urls/name_url.tsv"
+
+startup_times = {}
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    startup_times[label] = time.perf_counter() - start
+    return result
+
+
+def fight_count(graph, name):
+    f_id = graph.fighter_id(name)
+    if f_id is None:
+        return 0
+    return len(graph.wins(f_id)) + graph.loss_count[f_id]
+
+
+def load_names():
+    """
+    Name and suggestion indexes are pickled on first start and reloaded
+    until name_url.tsv or the record store change. The win graph is
+    loaded once either way, a rebuild ranks suggestions with it
+    :return tuple: Name index, suggestion index and win graph
+    """
+    loaded = []
+
+    def build_names():
+        name_index = NameIndex.from_file(NAME_URLS, path / "data/fighters")
+        loaded.append(timed('win graph', load_win_graph, name_index))
+
+        # Fighters with more recorded fights rank first in suggestions
+        return name_index, NameSearch(name_index,
+                                      {name: fight_count(loaded[0], name)
+                                       for name in name_index})
+
+    name_index, search = timed('names', cached_payload, build_names,
+                               [NAME_URLS, STORE_FILE])
+    if len(loaded) == 0:
+        loaded.append(timed('win graph', load_win_graph, name_index))
+
+    return name_index, search, loaded[0]
+
+
+name_db, name_search, win_graph = load_names()
+search_jobs = JobManager()
+
+
+def refresh_loop(hours):
+    from scrapers.record_scraper import refresh_records
+
+    while True:
+        time.sleep(hours * 60 * 60)
+
+        # A failed run is retried on the next one
+        try:
+            refresh_records(graph=win_graph)
+        except Exception as err:
+            print(f"Problem refreshing records: {err!r}")
+
+
+# Set MMA_REFRESH_HOURS to re-scrape stale records in the background
+# and patch them into win_graph without restarting the app
+if os.environ.get('MMA_REFRESH_HOURS'):
+    threading.Thread(target=refresh_loop,
+                     args=(float(os.environ['MMA_REFRESH_HOURS']),),
+                     daemon=True).start()
+
+
+def warm_imports():
+    """
+    Import the scraping and plotting modules in the background once the
+    server is starting, so the first search doesn't wait on pandas,
+    plotly, requests and bs4
+    """
+    start = time.perf_counter()
+    import scripts.stat_finder
+    import scripts.visual
+    startup_times['deferred imports'] = time.perf_counter() - start
+
+
+# Started on import so it also runs when app.server is served by a
+# WSGI server, MMA_WARM_IMPORTS=0 turns it off for startup_report
+if os.environ.get('MMA_WARM_IMPORTS', '1') != '0':
+    threading.Thread(target=warm_imports, daemon=True).start()
 
-name_list = list(name_db['name'].map(lambda x: html.Option(value=x)))
 
 """-----------------------------------------------
 Helpers for Updating stats and visuals
@@ -36,16 +127,67 @@ Helpers for Updating stats and visuals
 -----------------------------------------------"""
 
 
-def fighter_data(db, f_name):
-    link = name_to_url(db, f_name)
-    header = get_header_img(link)
-    records = scrape_ratio(link)
-    stats = scrape_stats(link)
+def fighter_data(db, fighter):
+    from scripts.stat_finder import cached_scrape_fighter
+
+    return cached_scrape_fighter(db.url(fighter))
+
+
+def fighters_data(db, fighters):
+    from scripts.stat_finder import scrape_fighters
+
+    return scrape_fighters([db.url(fighter) for fighter in fighters])
+
+
+def fighter_label(fighter):
+    return name_db.fighter_name(fighter) if isinstance(fighter, int) \
+        else fighter
 
-    return header, records, stats
+
+def fighter_figs(stats):
+    """
+    :param tuple stats: header, records, stats from fighter_data
+    :return dict: What the challenger panel shows for one fighter
+    """
+    plots = challenger_visuals(stats[1], stats[2])
+
+    return {
+        'header': challenger_img(*stats[0]),
+        'record': get_wins(stats[1]),
+        'wins': plots[1],
+        'totals': plots[0],
+        'targets': plots[2]
+    }
+
+
+def path_search(ch_id, op_id, check=None, progress=None):
+    """
+    Search job run by update_path. The fighters along the path are
+    fetched here too, so the timer tick that shows the path only reads
+    finished data and never blocks while the interval keeps firing
+    :param int ch_id: ESPN id of the challenger
+    :param int op_id: ESPN id of the opponent
+    :return tuple: Win path of ESPN ids, None if no path, and fig_dict
+                   entries of the fighters in between
+    """
+    win_path = mma_math(name_db, ch_id, op_id, win_graph, 'cached',
+                        check=check, progress=progress)
+    figs = {}
+
+    if win_path is not None and len(win_path) > 2:
+        id_list = win_path[1:-1]
+
+        # fig-storage is json, its keys come back as strings
+        for fighter, stats in zip(id_list, fighters_data(name_db, id_list)):
+            figs[str(fighter)] = fighter_figs(stats)
+
+    return win_path, figs
 
 
 def challenger_visuals(records, stats):
+    from scripts.visual import plot_ratios, plot_targets_reverse, \
+        plot_totals_reverse
+
     totals_graph = plot_totals_reverse(stats)
     striking_graph = plot_targets_reverse(stats)
     ratio_graph = plot_ratios(records)
@@ -54,6 +196,8 @@ def challenger_visuals(records, stats):
 
 
 def opponent_visuals(records, stats):
+    from scripts.visual import plot_ratios, plot_targets, plot_totals
+
     totals_graph = plot_totals(stats)
     striking_graph = plot_targets(stats)
     ratio_graph = plot_ratios(records)
@@ -61,6 +205,19 @@ def opponent_visuals(records, stats):
     return totals_graph, ratio_graph, striking_graph
 
 
+def hide_text(fig):
+    """
+    Copy of a figure from scripts.visual without bar labels, the figures
+    it returns are cached and shared so they are never changed in place
+    :param dict fig: Plotly figure
+    :return dict:
+    """
+    data = [{key: value for key, value in trace.items()
+             if key != 'textposition'} for trace in fig['data']]
+
+    return {'data': data, 'layout': fig['layout']}
+
+
 def format_time(n):
     minutes = int(n / 60)
     seconds = int(n % 60)
@@ -79,8 +236,8 @@ Html Content Wrappers
 -----------------------------------------------"""
 
 
-def input_suggestion():
-    return html.Datalist(id='suggestion', children=name_list)
+def input_suggestion(input_id):
+    return html.Datalist(id=input_id, children=[])
 
 
 def challenger_img(link, f_name, l_name):
@@ -139,7 +296,7 @@ def insert_fig(fig_id, fig):
 
 # Path Finder
 
-def initial_path(challenger, opponent):
+def initial_path(challenger, opponent, ch_key=None):
     return [
         dbc.Button(challenger, id='ch-button', className='ch-button'),
 
@@ -151,7 +308,8 @@ def initial_path(challenger, opponent):
 
         dbc.Button(opponent, id='op-button',
                    className='op-button'),
-        html.Div(challenger, id='current-figure', style={'display': 'none'}),
+        html.Div(challenger if ch_key is None else ch_key,
+                 id='current-figure', style={'display': 'none'}),
     ]
 
 
@@ -163,10 +321,10 @@ def find_path(fight_path):
 
         for fighter in win_list:
             path_list.append(
-                dbc.Button(fighter,
+                dbc.Button(fighter_label(fighter),
                            id={
                                'type': 'path-button',
-                               'name': fighter
+                               'fighter': str(fighter)
 
                            },
                            className='win-button',
@@ -181,6 +339,19 @@ def find_path(fight_path):
     return path_list
 
 
+def search_progress(event):
+    status = html.P(f"Depth {event['depth']} | "
+                    f"{event['visited']:,} fighters visited | "
+                    f"{event['frontier']:,} in frontier",
+                    className='side-text')
+
+    if event['path'] is None:
+        return status
+
+    # First path found, shown while the search wraps up
+    return [status] + find_path(event['path'])
+
+
 """-----------------------------------------------
 Layout Functions
 
@@ -200,7 +371,8 @@ def side_bar():
         ]),
         html.Hr(className='side-line'),
 
-        input_suggestion(),
+        input_suggestion('suggestion-a'),
+        input_suggestion('suggestion-b'),
         control_tabs(),
 
         html.Div(id='current-challenger', style={'display': 'none'}),
@@ -209,6 +381,7 @@ def side_bar():
         html.Div(id='timer-status', style={'display': 'none'}),
         dcc.Store(id='fig-storage'),
         dcc.Store(id='path-found'),
+        dcc.Store(id='search-job'),
     ]
                     )
 
@@ -225,7 +398,7 @@ def fighter_input():
                 dbc.Input(id='fighter-a', type='text',
                           valid=False, invalid=True,
                           placeholder='Input Challenger Name',
-                          list='suggestion')]
+                          list='suggestion-a', autoComplete='off')]
                           ),
 
             html.P('Beats', className='side-text'),
@@ -235,7 +408,7 @@ def fighter_input():
                 dbc.Input(id='fighter-b', type='text',
                           valid=False, invalid=True,
                           placeholder='Input Opponent Name',
-                          list='suggestion')]
+                          list='suggestion-b', autoComplete='off')]
                           ),
             dbc.Button('Confirm', id='submit', size='lg',
                        color='primary', disabled=True)]
@@ -281,18 +454,11 @@ def initial_layout():
     ch_plots = challenger_visuals(no_records, no_stats)
     op_plots = opponent_visuals(no_records, no_stats)
 
-    op_totals = insert_fig('op-totals', op_plots[0])
-    ch_totals = insert_fig('ch-totals', ch_plots[0])
-
-    op_totals.figure['data'][0].pop('textposition', None)
-    ch_totals.figure['data'][0].pop('textposition', None)
-
-    op_targets = insert_fig('op-targets', op_plots[2])
-    ch_targets = insert_fig('ch-targets', ch_plots[2])
+    op_totals = insert_fig('op-totals', hide_text(op_plots[0]))
+    ch_totals = insert_fig('ch-totals', hide_text(ch_plots[0]))
 
-    for i in range(3):
-        op_targets.figure['data'][i].pop('textposition', None)
-        ch_targets.figure['data'][i].pop('textposition', None)
+    op_targets = insert_fig('op-targets', hide_text(op_plots[2]))
+    ch_targets = insert_fig('ch-targets', hide_text(ch_plots[2]))
 
     return html.Div(className='content-area', children=[
         dbc.Row(className="top-row", children=[
@@ -392,14 +558,13 @@ def initial_layout():
     ])
 
 
-def content_layout(ch_name, op_name):
-    ch_data = fighter_data(name_db, ch_name)
+def content_layout(ch_id, op_id):
+    ch_data, op_data = fighters_data(name_db, [ch_id, op_id])
     ch_head = ch_data[0]
     ch_records = ch_data[1]
     ch_stats = ch_data[2]
     ch_plots = challenger_visuals(ch_records, ch_stats)
 
-    op_data = fighter_data(name_db, op_name)
     op_head = op_data[0]
     op_records = op_data[1]
     op_stats = op_data[2]
@@ -493,7 +658,9 @@ def content_layout(ch_name, op_name):
                     html.H4('MMA-MATH Path', className='path-title-text')
                 ]),
                 dbc.Row(id='path-row', className='path-row',
-                        children=initial_path(ch_name, op_name)
+                        children=initial_path(fighter_label(ch_id),
+                                              fighter_label(op_id),
+                                              str(ch_id))
                         ),
                 html.Div(id='is-loading-container', children=[
                     dcc.RadioItems(id='is-loading',
@@ -534,8 +701,9 @@ app.layout = html.Div(children=[
 )
 def check_name(a_name, b_name,
                a_curr_val, b_curr_val, a_curr_inv, b_curr_inv, b_dis):
-    a_link = name_to_url(name_db, a_name)
-    b_link = name_to_url(name_db, b_name)
+    a_name, b_name = name_db.resolve(a_name), name_db.resolve(b_name)
+    a_link = name_db.url(a_name)
+    b_link = name_db.url(b_name)
 
     a_valid = a_curr_val
     a_invalid = a_curr_inv
@@ -565,6 +733,24 @@ def check_name(a_name, b_name,
     return a_valid, a_invalid, b_valid, b_invalid, is_disabled
 
 
+@app.callback(
+    Output("suggestion-a", "children"),
+    [Input("fighter-a", "value")],
+    prevent_initial_call=True
+)
+def suggest_a(a_name):
+    return [html.Option(value=name) for name in name_search.suggest(a_name)]
+
+
+@app.callback(
+    Output("suggestion-b", "children"),
+    [Input("fighter-b", "value")],
+    prevent_initial_call=True
+)
+def suggest_b(b_name):
+    return [html.Option(value=name) for name in name_search.suggest(b_name)]
+
+
 @app.callback(
     [Output('layout', 'children'),
      Output('current-challenger', 'children'),
@@ -578,7 +764,9 @@ def update_dash(n, a_value, b_value):
     if n is None:
         return initial_layout(), None, None, dash.no_update
     else:
-        return content_layout(a_value, b_value), a_value, b_value, 0
+        # Fighters are passed around by ESPN id from here on
+        a_id, b_id = name_db.espn_id(a_value), name_db.espn_id(b_value)
+        return content_layout(a_id, b_id), a_id, b_id, 0
 
 
 @app.callback(
@@ -617,12 +805,15 @@ def update_tabs(n, disabled, loading, tab):
     [Output('path-holder', 'children'),
      Output('current-path', 'children'),
      Output("fig-storage", "data"),
-     Output("is-loading", "value")],
+     Output("is-loading", "value"),
+     Output("search-job", "data")],
     [Input("timer-start", "children"),
-     Input("abort", "n_clicks")],
+     Input("abort", "n_clicks"),
+     Input("timer-interval", "n_intervals")],
     [State("current-challenger", "children"),
      State("current-opponent", "children"),
      State("submit", "n_clicks"),
+     State("search-job", "data"),
      State('head-ch', 'children'),
      State('ch-recs', 'children'),
      State("ch-wins", "figure"),
@@ -630,9 +821,11 @@ def update_tabs(n, disabled, loading, tab):
      State("ch-targets", "figure")],
     prevent_initial_call=True
 )
-def update_path(start, abort, ch_name, op_name, clicks, header, recs, wins, totals, targets):
-    if clicks is None or ch_name is None:
-        return find_path([]), dash.no_update, dash.no_update, dash.no_update
+def update_path(start, abort, n, ch_id, op_id, clicks, job_id,
+                header, recs, wins, totals, targets):
+    if clicks is None or ch_id is None:
+        return (find_path([]), dash.no_update, dash.no_update,
+                dash.no_update, dash.no_update)
 
     context = dash.callback_context
     t_id = (context.triggered[0]['prop_id']).split('.')[0]
@@ -640,7 +833,42 @@ def update_path(start, abort, ch_name, op_name, clicks, header, recs, wins, tota
 
     if t_id == 'abort':
         print('ABORT SEARCH')
-        return html.H2('NO PATH FOUND'), [], {}, 'False'
+        search_jobs.cancel(job_id)
+        return html.H2('NO PATH FOUND'), [], {}, 'False', None
+
+    if t_id == 'timer-start':
+        search_jobs.cancel(job_id)
+        new_job = search_jobs.submit(path_search, ch_id, op_id)
+        return (dash.no_update, dash.no_update, dash.no_update,
+                dash.no_update, new_job)
+
+    # Timer tick, check on the running search
+    if job_id is None:
+        raise PreventUpdate
+
+    # Expired, or submitted to a server process this poll didn't reach
+    status = search_jobs.status(job_id)
+
+    if status == 'missing':
+        return html.H2('SEARCH LOST, TRY AGAIN'), [], {}, 'False', None
+
+    if status == 'running':
+        progress = search_jobs.progress(job_id)
+
+        if progress is None:
+            raise PreventUpdate
+
+        return (search_progress(progress), dash.no_update, dash.no_update,
+                dash.no_update, dash.no_update)
+
+    if status != 'done':
+        search_jobs.cancel(job_id)
+        message = 'SEARCH TIMED OUT' if status == 'timeout' else 'NO PATH FOUND'
+        return html.H2(message), [], {}, 'False', None
+
+    # Read without removing, if this response is dropped the next tick
+    # renders the same result
+    win_path, figs = search_jobs.result(job_id)
 
     fig_dict = {}
 
@@ -652,33 +880,15 @@ def update_path(start, abort, ch_name, op_name, clicks, header, recs, wins, tota
         'targets': targets
     }
 
-    fig_dict[ch_name] = ch_data
-
-    win_path = mma_math(name_db, ch_name, op_name)
+    fig_dict[str(ch_id)] = ch_data
 
     if win_path is None:
-        return html.H2('NO PATH FOUND'), [], {}, 'False'
+        return html.H2('NO PATH FOUND'), [], {}, 'False', None
 
     fight_path = find_path(win_path)
+    fig_dict.update(figs)
 
-    if len(win_path) > 2:
-        id_list = win_path[1:-1]
-
-        for fighter in id_list:
-            stats = fighter_data(name_db, fighter)
-            plots = challenger_visuals(stats[1], stats[2])
-
-            fig_dict[fighter] = {
-                'header': challenger_img(*stats[0]),
-                'record': get_wins(stats[1]),
-                'wins': plots[1],
-                'totals': plots[0],
-                'targets': plots[2]
-            }
-    else:
-        id_list = []
-
-    return fight_path, id_list, fig_dict, 'False'
+    return fight_path, win_path[1:-1], fig_dict, 'False', None
 
 
 @app.callback(
@@ -689,33 +899,35 @@ def update_path(start, abort, ch_name, op_name, clicks, header, recs, wins, tota
      Output('ch-targets', 'figure'),
      Output('current-figure', 'children')],
     [Input('ch-button', 'n_clicks'),
-     Input({'type': 'path-button', 'name': ALL}, 'n_clicks')],
-    [State({'type': 'path-button', 'name': ALL}, 'children'),
-     State('ch-button', 'children'),
-     State('current-challenger', 'children'),
+     Input({'type': 'path-button', 'fighter': ALL}, 'n_clicks')],
+    [State('current-challenger', 'children'),
      State('current-figure', 'children'),
      State("fig-storage", "data")],
     prevent_initial_call=True
 )
-def click_path(nc, np, children, ch_name, ch_data, curr_figure, fig_dict):
+def click_path(nc, np, ch_id, curr_figure, fig_dict):
     context = dash.callback_context
 
     if len(context.triggered) > 1 or context.triggered[0]['value'] is None:
         raise PreventUpdate
     else:
 
-        clicked = (context.triggered[0]['prop_id']).split('.')[0]
-        name = context.states[f"{clicked}.children"]
+        clicked = (context.triggered[0]['prop_id']).rsplit('.', 1)[0]
+
+        if clicked == 'ch-button':
+            fighter = str(ch_id)
+        else:
+            fighter = json.loads(clicked)['fighter']
 
-        if name == curr_figure:
+        if fighter == curr_figure:
             print('current fighter shown')
             raise PreventUpdate
         else:
 
-            data = fig_dict[name]
+            data = fig_dict[fighter]
             return (data['header'], data['record'],
                     data['wins'], data['totals'], data['targets'],
-                    name)
+                    fighter)
 
 
 # Run App
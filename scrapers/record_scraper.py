@@ -3,21 +3,121 @@ Author: Aaron Ho
 Python Version: 3.7
 """
 
+import hashlib
+import io
+import os
+import random
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from urllib.error import HTTPError
 
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
 
+from scripts.name_index import NameIndex, link_to_id
+from scripts.record_store import STORE_FILE, read_record, write_store
 
-def update_record(link):
+MANIFEST_FILE = Path(__file__).parent / "../data/record_manifest.tsv"
+NAME_FILE = Path(__file__).parent / "../data/urls/name_url.tsv"
+ERROR_FILE = Path(__file__).parent / "../data/urls/url_errors.txt"
+
+DAY = 24 * 60 * 60
+
+# Status codes worth retrying, anything else fails immediately
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+error_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket allowing rate requests per second
+    with bursts of up to capacity requests
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last) * self.rate)
+                self.last = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def make_session(workers):
+    """
+    Session keeping one keep-alive connection per worker
+    :param int workers: Number of threads sharing the session
+    :return: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_history(history_link, session, limiter=None, retries=0, backoff=1.0):
+    """
+    Download a fight history table, retrying transient failures with
+    exponential backoff and jitter
+    :param str history_link: URL to fighter history page
+    :param session: requests.Session
+    :param TokenBucket limiter: Rate limiter shared between workers
+    :param int retries: Retries after the first attempt
+    :param float backoff: Seconds to wait before the first retry
+    :return DataFrame: Opponent and result columns
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+
+        try:
+            response = session.get(history_link, timeout=10)
+            response.raise_for_status()
+            return (pd.read_html(io.StringIO(response.text))[0])[['Opponent',
+                                                                  'Res.']]
+
+        except requests.RequestException as err:
+            status = getattr(err.response, 'status_code', None)
+
+            if attempt == retries or (status is not None and
+                                      status not in RETRY_STATUS):
+                raise
+
+            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+
+def update_record(link, session=None, limiter=None, retries=0):
     split_url = link.split('_')
     history_link = f"{split_url[0]}history/_{split_url[1]}"
     path = Path(__file__).parent
 
+    if session is None:
+        session = make_session(1)
+
     try:
-        df_record = (pd.read_html(history_link)[0])[['Opponent', 'Res.']]
-        file_pre = link.split('/')[-1]
+        df_record = fetch_history(history_link, session, limiter, retries)
+        # Keyed by ESPN id too, fighters can share a name and a slug
+        file_pre = f"{link.split('/')[-1]}-{link_to_id(link)}"
         file_name = path / f"../data/fighters/{file_pre}.tsv"
         df_record.to_csv(file_name, sep='\t', index=False, header=False)
         print(f"{file_pre}.tsv written!")
@@ -26,36 +126,67 @@ def update_record(link):
         print('Database not written')
         return None
 
-    except HTTPError as err:
-        print(err.code)
+    except requests.RequestException as err:
+        print(getattr(err.response, 'status_code', err))
         print(f"Problem reaching {link}")
-        print("Written to url_errors.txt")
-        with open(path / "../data/urls/url_errors.txt", "a") as file:
+        log_url_error(link)
+
+
+def log_url_error(link):
+    print("Written to url_errors.txt")
+    with error_lock:
+        with open(ERROR_FILE, "a") as file:
             file.write(f"{link}\n")
 
 
-def build_from_file(url_file):
+def crawl_records(url_list, workers=8, rate=5.0, retries=4):
+    """
+    Fetch records concurrently over pooled keep-alive connections.
+    Fighters whose record can't be fetched, parsed or written are
+    logged to url_errors.txt
+    :param list url_list: Fighter urls
+    :param int workers: Number of concurrent requests
+    :param float rate: Maximum requests per second across all workers
+    :param int retries: Retries per fighter before logging to url_errors.txt
+    """
+    session = make_session(workers)
+    limiter = TokenBucket(rate, capacity=workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(update_record, link, session, limiter,
+                               retries): link
+                   for link in url_list}
+
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as err:
+                print(f"Problem writing {futures[future]}: {err!r}")
+                log_url_error(futures[future])
+
+
+def build_from_file(url_file, workers=8, rate=5.0):
     with open(url_file, 'r') as file:
         url_list = [line.rstrip() for line in file]
 
-    for link in url_list:
-        update_record(link)
+    crawl_records(url_list, workers, rate)
 
     print('ALL RECORDS FOUND!')
 
 
-def build_all_records(name_urls):
+def build_all_records(name_urls, workers=8, rate=5.0):
     """
     Retrieves records for ALL fighters
-    WILL TAKE A LONG TIME!!!
+    Runs workers requests at a time, capped at rate requests per second
     :param str name_urls: File containing fighter urls
+    :param int workers: Number of concurrent requests
+    :param float rate: Maximum requests per second
     """
     name_db = pd.read_csv(name_urls, sep='\t',
                           header=None, names=['name', 'link'])
     url_list = list(name_db['link'])
 
-    for link in url_list:
-        update_record(link)
+    crawl_records(url_list, workers, rate)
 
     print('ALL RECORDS FOUND!')
 
@@ -76,6 +207,188 @@ def update_directories():
         print(f"Created {new_path}")
 
 
+def update_store():
+    """
+    Rebuild data/records.bin from the sharded record directories
+    """
+    path = Path(__file__).parent
+    name_index = NameIndex.from_file(path / "../data/urls/name_url.tsv")
+    write_store(name_index, path / "../data/records.bin")
+
+
+def read_manifest(manifest_file=MANIFEST_FILE):
+    """
+    Per fighter refresh state
+    :param str manifest_file: TSV of link, fetched, changed, hash
+    :return dict: link to [fetched, changed, hash]
+    """
+    manifest = {}
+
+    try:
+        with open(manifest_file, 'r') as file:
+            for line in file:
+                link, fetched, changed, digest = line.rstrip('\n').split('\t')
+                manifest[link] = [float(fetched), float(changed), digest]
+
+    except FileNotFoundError:
+        pass
+
+    return manifest
+
+
+def write_manifest(manifest, manifest_file=MANIFEST_FILE):
+    tmp_file = Path(f"{manifest_file}.tmp")
+
+    with open(tmp_file, 'w') as file:
+        for link, (fetched, changed, digest) in manifest.items():
+            file.write(f"{link}\t{fetched}\t{changed}\t{digest}\n")
+
+    os.replace(tmp_file, manifest_file)
+
+
+def file_digest(fight_file):
+    try:
+        with open(fight_file, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+
+    except FileNotFoundError:
+        return ''
+
+
+def due_links(links, manifest, max_age, now):
+    """
+    Fighters not fetched within max_age, most recently active first.
+    A fighter counts as active when their record, or an opponent's
+    record naming them, last changed
+    """
+    empty = [0.0, 0.0, '']
+    due = [link for link in links
+           if now - manifest.get(link, empty)[0] >= max_age]
+    due.sort(key=lambda link: manifest.get(link, empty)[1], reverse=True)
+    return due
+
+
+def refresh_record(link, session, limiter, retries):
+    split_url = link.split('_')
+    history_link = f"{split_url[0]}history/_{split_url[1]}"
+    df_record = fetch_history(history_link, session, limiter, retries)
+    content = df_record.to_csv(sep='\t', index=False, header=False)
+
+    return content, hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def refresh_entry(result, link, espn_id, name_index, manifest, changed,
+                  now):
+    """
+    Write a fetched record if its content hash changed and update its
+    manifest entry, changed records are added to changed
+    :param tuple result: Record content and its hash from refresh_record
+    """
+    content, digest = result
+    fight_file = name_index.fighter_file(espn_id)
+    entry = list(manifest.get(link, [0.0, 0.0, '']))
+    entry[0] = now
+
+    if entry[2] == '':
+        entry[2] = file_digest(fight_file)
+
+    id_file = name_index.id_file(espn_id)
+    old_record = []
+
+    # Unchanged records kept in {slug}.tsv move to the id file too
+    if digest != entry[2] or fight_file != id_file:
+        old_record = read_record(fight_file) or []
+        id_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(id_file, 'w', encoding='utf-8') as file:
+            file.write(content)
+
+    if digest != entry[2]:
+        entry[1] = now
+        entry[2] = digest
+        changed[espn_id] = [tuple(line.split('\t')[:2])
+                            for line in content.splitlines()]
+
+    manifest[link] = entry
+
+    # New opponents fought recently too, move them up the queue
+    if espn_id in changed:
+        for opponent in {fight[0] for fight in changed[espn_id]} - \
+                {fight[0] for fight in old_record}:
+            op_link = name_index.url(opponent)
+            if op_link is not None:
+                op_entry = manifest.setdefault(op_link, [0.0, 0.0, ''])
+                op_entry[0] = 0.0
+                op_entry[1] = now
+
+
+def refresh_records(name_urls=NAME_FILE, manifest_file=MANIFEST_FILE,
+                    max_age=7 * DAY, limit=None, workers=8, rate=5.0,
+                    retries=4, graph=None):
+    """
+    Re-scrape only fighters that are due, write records whose content
+    hash changed and patch them into a live WinGraph
+    :param str name_urls: File containing fighter names and urls
+    :param str manifest_file: Refresh state written by the last run
+    :param float max_age: Seconds before a record is due again
+    :param int limit: Most fighters to fetch this run, None for all due
+    :param int workers: Number of concurrent requests
+    :param float rate: Maximum requests per second
+    :param int retries: Retries per fighter before skipping to next run
+    :param WinGraph graph: Graph to patch in place
+    :return list: ESPN ids of fighters whose record changed
+    """
+    name_index = NameIndex.from_file(name_urls)
+    link_ids = {entry[1]: espn_id
+                for espn_id, entry in name_index.fighters.items()}
+    manifest = read_manifest(manifest_file)
+    now = time.time()
+
+    # Fighters only covered by a shared {slug}.tsv have no record yet
+    for link, espn_id in link_ids.items():
+        if link in manifest and \
+                not name_index.fighter_file(espn_id).exists():
+            manifest[link] = [0.0, manifest[link][1], '']
+
+    due = due_links(list(link_ids), manifest, max_age, now)[:limit]
+    print(f"Refreshing {len(due)} of {len(link_ids)} records")
+
+    session = make_session(workers)
+    limiter = TokenBucket(rate, capacity=workers)
+    changed = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(refresh_record, link, session, limiter,
+                                   retries): link
+                       for link in due}
+
+            for future in as_completed(futures):
+                link = futures[future]
+
+                # A failed fighter stays due, its manifest entry is only
+                # replaced once its record is written
+                try:
+                    refresh_entry(future.result(), link, link_ids[link],
+                                  name_index, manifest, changed, now)
+                except Exception as err:
+                    print(f"Problem refreshing {link}: {err!r}")
+
+    finally:
+        # Records already written reach the manifest and graph even if
+        # the run stops early
+        write_manifest(manifest, manifest_file)
+        print(f"{len(changed)} records changed")
+
+        if len(changed) > 0:
+            if graph is not None:
+                graph.patch(changed)
+
+            if STORE_FILE.exists():
+                write_store(name_index)
+
+    return list(changed)
+
+
 def main():
     pass
 
@@ -0,0 +1,156 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+from scripts.name_index import NameIndex
+from scripts.record_store import RecordStore, STORE_FILE
+from scripts.tree_cache import tree_from, tree_path
+
+BATCH_WORKERS = os.cpu_count() or 1
+COLUMNS = ['challenger', 'opponent', 'length', 'path']
+
+# Graph mapped by each worker process from the record store
+worker_graph = None
+
+
+def one_vs_many(graph, fighter_a, fighters_b):
+    """
+    Answer every opponent from a single BFS out of Fighter A, reusing
+    the tree from graph.trees when the challenger was searched before
+    :param WinGraph graph: Preloaded win graph
+    :param fighter_a: ESPN id or name of Fighter A
+    :param list fighters_b: ESPN ids or names of opponents
+    :return list: One (challenger, opponent, length, path) row per
+                  opponent, length and path are None if there is no path.
+                  Fighters not in the graph are echoed as they were asked
+    """
+    a_id = graph.node(fighter_a)
+    b_ids = [graph.node(fighter_b) for fighter_b in fighters_b]
+
+    parent = None if a_id is None else tree_from(graph, a_id)[1]
+
+    rows = []
+    for fighter_b, b_id in zip(fighters_b, b_ids):
+        path = None if parent is None else tree_path(parent, a_id, b_id)
+        names = None if path is None else [graph.names[f_id] for f_id in path]
+
+        rows.append((fighter_a if a_id is None else graph.names[a_id],
+                     fighter_b if b_id is None else graph.names[b_id],
+                     None if path is None else len(path) - 1,
+                     names))
+
+    return rows
+
+
+def init_worker(store_file):
+    global worker_graph
+    worker_graph = RecordStore(store_file).win_graph()
+
+
+def worker_rows(fighter_a, fighters_b):
+    return one_vs_many(worker_graph, fighter_a, fighters_b)
+
+
+def many_vs_many(graph, fighters_a, fighters_b, workers=BATCH_WORKERS,
+                 store_file=STORE_FILE):
+    """
+    N x M matrix of shortest win paths, one BFS per distinct challenger.
+    Challengers are split across worker processes that each map the
+    record store, so the graph is never pickled. Without a store, or
+    with a single worker, everything runs in this process on graph
+    :param WinGraph graph: Preloaded win graph
+    :param list fighters_a: ESPN ids or names of challengers
+    :param list fighters_b: ESPN ids or names of opponents
+    :param int workers: Processes to use
+    :param str store_file: Record store written by write_store
+    :return list: Rows as returned by one_vs_many, challenger major
+    """
+    sources = list(dict.fromkeys(fighters_a))
+    rows = []
+
+    if workers <= 1 or len(sources) <= 1 or not Path(store_file).exists():
+        for fighter_a in sources:
+            rows.extend(one_vs_many(graph, fighter_a, fighters_b))
+        return rows
+
+    chunk = max(1, len(sources) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(store_file,)) as pool:
+        for part in pool.map(worker_rows, sources, repeat(fighters_b),
+                             chunksize=chunk):
+            rows.extend(part)
+
+    return rows
+
+
+def write_rows(rows, out_file):
+    """
+    Write batch rows as Parquet when out_file ends in .parquet,
+    otherwise as CSV with the path joined by ' > '
+    :param list rows: Rows from one_vs_many or many_vs_many
+    :param str out_file: File to write
+    """
+    if str(out_file).endswith('.parquet'):
+        import pandas as pd
+
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(out_file, index=False)
+    else:
+        with open(out_file, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(COLUMNS)
+
+            for challenger, opponent, length, path in rows:
+                writer.writerow([challenger, opponent, length,
+                                 None if path is None else ' > '.join(path)])
+
+    print(f"{len(rows)} rows written to {out_file}")
+
+
+def batch_query(db, graph, fighters_a, fighters_b, out_file=None,
+                workers=BATCH_WORKERS):
+    """
+    Names in, rows out. Names are turned into ESPN ids here so fighters
+    sharing a name resolve the same way they do in mma_math
+    :param NameIndex db: Name index
+    :param WinGraph graph: Preloaded win graph
+    :param list fighters_a: Names of challengers
+    :param list fighters_b: Names of opponents
+    :param str out_file: CSV or Parquet file to write, None to skip
+    :param int workers: Processes to use
+    :return list: Rows as returned by many_vs_many
+    """
+    asked = {}
+
+    if isinstance(db, NameIndex):
+        for name in list(fighters_a) + list(fighters_b):
+            asked.setdefault(db.espn_id(name) or name, name)
+
+        fighters_a = [db.espn_id(name) or name for name in fighters_a]
+        fighters_b = [db.espn_id(name) or name for name in fighters_b]
+
+    # Fighters missing from the graph are reported by the name asked for
+    rows = [(asked.get(challenger, challenger), asked.get(opponent, opponent),
+             length, path)
+            for challenger, opponent, length, path in
+            many_vs_many(graph, fighters_a, fighters_b, workers)]
+
+    if out_file is not None:
+        write_rows(rows, out_file)
+
+    return rows
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
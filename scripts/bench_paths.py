@@ -0,0 +1,204 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import io
+import random
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from scripts.landmarks import build_landmarks, bfs_tree, load_landmarks
+from scripts.name_index import NameIndex
+from scripts.path_finder import make_graph, search_graph
+from scripts.tree_cache import TreeCache
+from scripts.win_graph import WinGraph
+
+BENCH_ENGINES = ('forward', 'pruned', 'bidirectional', 'matrix', 'component',
+                 'landmark', 'tree', 'cached')
+PAIR_KINDS = ('near', 'far', 'no_path', 'undefeated')
+
+
+def make_workload(graph, seed=0, per_kind=25, near=3, far=6):
+    """
+    Seeded fighter pairs, the same seed always gives the same pairs
+    for the same data
+    :param WinGraph graph: Win graph loaded from data/fighters
+    :param int seed: Random seed
+    :param int per_kind: Pairs of each kind
+    :param int near: Longest path counted as near
+    :param int far: Shortest path counted as far
+    :return dict: Kind to list of (fighter_a, fighter_b) node ids
+    """
+    rand = random.Random(seed)
+    offsets, targets = graph.csr[:2]
+    sources = [f_id for f_id in range(len(graph.espn_ids))
+               if offsets[f_id + 1] > offsets[f_id]]
+    workload = {kind: [] for kind in PAIR_KINDS}
+
+    def full(kind):
+        return len(workload[kind]) >= per_kind
+
+    for _ in range(per_kind * 200):
+        if all(full(kind) for kind in PAIR_KINDS):
+            break
+
+        a_id = rand.choice(sources)
+        dist = bfs_tree(offsets, targets, a_id)[0]
+        b_id = rand.randrange(len(graph.espn_ids))
+
+        if b_id == a_id:
+            continue
+        elif not graph.has_losses(b_id):
+            kind = 'undefeated'
+        elif dist[b_id] < 0:
+            kind = 'no_path'
+        elif dist[b_id] <= near:
+            kind = 'near'
+        elif dist[b_id] >= far:
+            kind = 'far'
+        else:
+            continue
+
+        if not full(kind):
+            workload[kind].append((a_id, b_id))
+
+    return workload
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_engine(graph, engine, pairs):
+    """
+    Search through search_graph so the undefeated and same fighter
+    checks mma_math makes are timed too. Every run starts with an
+    empty tree cache, so the tree engines are timed cold
+    :return tuple: Latencies in ms and fighters expanded per pair
+    """
+    latencies = []
+    expanded = []
+    graph.trees = TreeCache()
+
+    for a_id, b_id in pairs:
+        events = [{'visited': 0}]
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            search_graph(graph, a_id, b_id, engine, progress=events.append)
+        latencies.append((time.perf_counter() - start) * 1000)
+        expanded.append(events[-1]['visited'])
+
+    return latencies, expanded
+
+
+def run_legacy(db, graph, pairs):
+    """
+    Original make_graph search reading a record file per fighter
+    :return tuple: Latencies in ms and fighters expanded per pair
+    """
+    latencies = []
+    expanded = []
+
+    for a_id, b_id in pairs:
+        count = [0]
+
+        def check():
+            count[0] += 1
+
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            make_graph(db, graph.names[a_id], graph.names[b_id], check)
+        latencies.append((time.perf_counter() - start) * 1000)
+        expanded.append(count[0])
+
+    return latencies, expanded
+
+
+def peak_memory(run, *args):
+    """
+    :return int: Peak bytes allocated while running, measured on a
+                 separate run so tracing doesn't skew latency
+    """
+    tracemalloc.start()
+    run(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def bench(name_urls, engines=BENCH_ENGINES, seed=0, per_kind=25,
+          legacy=False, out_file=None):
+    """
+    Replay the seeded workload against every engine and print
+    latency percentiles, fighters expanded, record files read and
+    peak memory per engine and pair kind
+    :param str name_urls: File containing fighter names and urls
+    :param tuple engines: Keys of SEARCH_ENGINES to run
+    :param int seed: Workload seed
+    :param int per_kind: Pairs of each kind
+    :param bool legacy: Also run make_graph over the record files, slow
+    :param str out_file: Append results here as tsv when given
+    :return list: Result rows
+    """
+    name_index = NameIndex.from_file(name_urls)
+
+    start = time.perf_counter()
+    graph = WinGraph.from_records(name_index)
+    load_ms = (time.perf_counter() - start) * 1000
+    load_files = sum(1 for fight_file in name_index.fighter_files()
+                     if fight_file is not None and fight_file.exists())
+    print(f"Graph loaded from {load_files} record files in {load_ms:.0f} ms")
+
+    if 'landmark' in engines or 'cached' in engines:
+        graph.landmarks = load_landmarks(graph) or build_landmarks(graph)
+
+    workload = make_workload(graph, seed, per_kind)
+    runs = [(engine, run_engine, (graph, engine)) for engine in engines]
+    if legacy:
+        runs.append(('legacy', run_legacy, (name_index, graph)))
+
+    rows = []
+    print(f"{'engine':<14}{'pairs':<12}{'n':>4}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'expanded':>10}{'files':>8}{'peak KB':>10}")
+
+    for engine, run, args in runs:
+        for kind in PAIR_KINDS:
+            pairs = workload[kind]
+            if len(pairs) == 0:
+                continue
+
+            latencies, expanded = run(*args, pairs)
+            mean_expanded = sum(expanded) / len(expanded)
+            # The legacy search reads B's record and one per fighter
+            files = mean_expanded + 1 if engine == 'legacy' else 0
+            peak = peak_memory(run, *args, pairs)
+
+            row = (engine, kind, len(pairs), percentile(latencies, 50),
+                   percentile(latencies, 95), percentile(latencies, 99),
+                   mean_expanded, files, peak / 1024)
+            rows.append(row)
+            print(f"{row[0]:<14}{row[1]:<12}{row[2]:>4}{row[3]:>10.2f}"
+                  f"{row[4]:>10.2f}{row[5]:>10.2f}{row[6]:>10.0f}"
+                  f"{row[7]:>8.0f}{row[8]:>10.0f}")
+
+    if out_file is not None:
+        with open(out_file, 'a', encoding='utf-8') as file:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            for row in rows:
+                file.write('\t'.join([stamp, str(seed)] +
+                                     [str(value) for value in row]) + '\n')
+
+    return rows
+
+
+def main():
+    path = Path(__file__).parent
+    bench(path / "../data/urls/name_url.tsv")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+from array import array
+
+
+def strongly_connected(offsets, targets):
+    """
+    Iterative Tarjan's algorithm over the win graph. Components are
+    numbered as they complete, so every component a component can
+    reach has a lower number
+    :param offsets: CSR offsets
+    :param targets: CSR targets
+    :return tuple: Component of every fighter and number of components
+    """
+    size = len(offsets) - 1
+    order = array('i', [-1]) * size
+    low = array('i', [0]) * size
+    comp = array('i', [-1]) * size
+    on_stack = bytearray(size)
+    stack = []
+    counter = 0
+    n_comps = 0
+
+    for root in range(size):
+        if order[root] >= 0:
+            continue
+
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [(root, offsets[root])]
+
+        while len(work) > 0:
+            v, i = work[-1]
+            end = offsets[v + 1]
+
+            while i < end:
+                w = targets[i]
+                i += 1
+
+                if order[w] < 0:
+                    work[-1] = (v, i)
+                    order[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = 1
+                    work.append((w, offsets[w]))
+                    break
+                elif on_stack[w] and order[w] < low[v]:
+                    low[v] = order[w]
+            else:
+                work.pop()
+                if len(work) > 0 and low[v] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[v]
+
+                if low[v] == order[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        comp[w] = n_comps
+                        if w == v:
+                            break
+                    n_comps += 1
+
+    return comp, n_comps
+
+
+class ComponentIndex:
+    """
+    Reachability over the condensation of the win graph, where every
+    strongly connected component becomes one node of a DAG.
+
+    Most components are single fighters without wins. Only components
+    with wins get a bit, largest first so the bitsets stay short, and
+    reach[c] holds the bits of every such component c can reach. A
+    winless fighter is instead marked by the bits of the components
+    that beat them, so either way Fighter A can beat Fighter B exactly
+    when reach[comp[A]] & goal[comp[B]] is non zero
+    """
+
+    def __init__(self, comp, reach, goal, n_names, n_edges, graph_version=0):
+        self.comp = comp
+        self.reach = reach
+        self.goal = goal
+        self.n_names = n_names
+        self.n_edges = n_edges
+        self.graph_version = graph_version
+
+    def matches(self, graph):
+        return (self.n_names == len(graph.offsets) - 1 and
+                self.n_edges == len(graph.targets) and
+                self.graph_version == graph.version)
+
+    def can_reach(self, a_id, b_id):
+        return a_id == b_id or \
+            self.reach[self.comp[a_id]] & self.goal[self.comp[b_id]] != 0
+
+
+def build_components(graph):
+    """
+    Condense the win graph and build the reachability bitsets
+    :param WinGraph graph: Preloaded win graph
+    :return: ComponentIndex
+    """
+    offsets, targets, loss_offsets, loss_targets = graph.csr
+    comp, n_comps = strongly_connected(offsets, targets)
+
+    sizes = [0] * n_comps
+    succ = [set() for _ in range(n_comps)]
+
+    for f_id in range(len(offsets) - 1):
+        sizes[comp[f_id]] += 1
+        for i in targets[offsets[f_id]:offsets[f_id + 1]]:
+            succ[comp[f_id]].add(comp[i])
+
+    has_wins = [c for c in range(n_comps) if len(succ[c]) > 0]
+    bit = {c: 1 << k for k, c in enumerate(
+        sorted(has_wins, key=sizes.__getitem__, reverse=True))}
+
+    # Successors always have lower numbers, so count up
+    reach = [0] * n_comps
+    for c in has_wins:
+        bits = bit[c]
+        for d in succ[c]:
+            bits |= reach[d]
+        reach[c] = bits
+
+    goal = [bit.get(c, 0) for c in range(n_comps)]
+    for f_id in range(len(offsets) - 1):
+        if goal[comp[f_id]] == 0:
+            for i in loss_targets[loss_offsets[f_id]:loss_offsets[f_id + 1]]:
+                goal[comp[f_id]] |= bit[comp[i]]
+
+    return ComponentIndex(comp, reach, goal, len(offsets) - 1, len(targets),
+                          graph.version)
+
+
+def component_index(graph):
+    """
+    The graph's ComponentIndex, rebuilt once after the graph is patched
+    """
+    index = graph.components
+    if index is None or not index.matches(graph):
+        index = build_components(graph)
+        graph.components = index
+    return index
+
+
+def component_steps(graph, a_id, b_id, fallback=None, check=None):
+    """
+    Reject pairs the condensation proves unreachable without searching,
+    otherwise run the fallback search
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param int b_id: Id of fighter B
+    :param fallback: Search generator used for reachable pairs
+    :param check: Passed on to the fallback search
+    :return: Generator returning fighter ids along the shortest path,
+             None if no path
+    """
+    if not component_index(graph).can_reach(a_id, b_id):
+        return None
+
+    return (yield from fallback(graph, a_id, b_id, check=check))
@@ -0,0 +1,334 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+LANDMARK_FILE = Path(__file__).parent / "../data/landmarks.bin"
+
+MAGIC = b'MMAL'
+VERSION = 2
+HEADER = struct.Struct('<4sIIIII')
+
+UNREACHABLE = sys.maxsize
+
+
+def bfs_levels(offsets, targets, source, check=None):
+    """
+    Full breadth first search from a single source, one level at a time
+    :param offsets: CSR offsets
+    :param targets: CSR targets
+    :param int source: Fighter id to search from
+    :param check: Called once per level, raises to stop the search
+    :return: Generator yielding (depth, frontier, visited) after each
+             level, returns dist and parent arrays, -1 where unreachable
+    """
+    size = len(offsets) - 1
+    dist = array('i', [-1]) * size
+    parent = array('i', [-1]) * size
+    dist[source] = 0
+    parent[source] = source
+    frontier = [source]
+    depth = 0
+    visited = 1
+
+    while len(frontier) > 0:
+        if check is not None:
+            check()
+
+        depth += 1
+        next_frontier = []
+
+        for curr_fighter in frontier:
+            for i in targets[offsets[curr_fighter]:offsets[curr_fighter + 1]]:
+                if dist[i] < 0:
+                    dist[i] = depth
+                    parent[i] = curr_fighter
+                    next_frontier.append(i)
+
+        frontier = next_frontier
+        visited += len(frontier)
+        yield depth, len(frontier), visited
+
+    return dist, parent
+
+
+def bfs_tree(offsets, targets, source, check=None):
+    """
+    bfs_levels run to the end
+    :return tuple: dist and parent arrays, -1 where unreachable
+    """
+    levels = bfs_levels(offsets, targets, source, check)
+
+    while True:
+        try:
+            next(levels)
+        except StopIteration as done:
+            return done.value
+
+
+def csr_checksum(graph):
+    """
+    crc32 of the win edges as uint32, so tables built from a record store
+    with the same number of fighters and fights but different fights in
+    it are never reused
+    :param WinGraph graph: Preloaded win graph
+    :return int:
+    """
+    checksum = 0
+
+    for column in graph.csr[:2]:
+        if getattr(column, 'typecode', getattr(column, 'format', None)) != 'I':
+            column = array('I', column)
+        checksum = zlib.crc32(column, checksum)
+
+    return checksum
+
+
+class LandmarkIndex:
+    """
+    Precomputed shortest win distances to and from a few landmark fighters.
+
+    fwd_dist[k][v] is how many wins landmark k needs to reach v and
+    fwd_prev[k] is the matching BFS tree. bwd_dist[k][v] is how many wins
+    v needs to reach landmark k and bwd_next[k][v] is v's next step.
+    Queries starting or ending at a landmark are answered by walking a
+    tree. For every other query the tables give lower and upper bounds
+    on the path length, which prove a pair unreachable or, when the
+    bounds meet, give a shortest path through a landmark
+    """
+
+    def __init__(self, landmarks, fwd_dist, fwd_prev, bwd_dist, bwd_next,
+                 n_names, n_edges, checksum=0, graph_version=0):
+        self.landmarks = landmarks
+        self.slot = {f_id: k for k, f_id in enumerate(landmarks)}
+        self.fwd_dist = fwd_dist
+        self.fwd_prev = fwd_prev
+        self.bwd_dist = bwd_dist
+        self.bwd_next = bwd_next
+        self.n_names = n_names
+        self.n_edges = n_edges
+        self.checksum = checksum
+        self.graph_version = graph_version
+
+    def matches(self, graph):
+        return (self.n_names == len(graph.offsets) - 1 and
+                self.n_edges == len(graph.targets) and
+                self.graph_version == graph.version)
+
+    def covers(self, a_id, b_id):
+        return a_id in self.slot or b_id in self.slot
+
+    def lookup(self, a_id, b_id):
+        """
+        Shortest path when either fighter is a landmark
+        :return list: Fighter ids along shortest path, None if no path
+        """
+        if a_id in self.slot:
+            prev = self.fwd_prev[self.slot[a_id]]
+            if prev[b_id] < 0:
+                return None
+
+            path = [b_id]
+            while path[-1] != a_id:
+                path.append(prev[path[-1]])
+            path.reverse()
+            return path
+
+        succ = self.bwd_next[self.slot[b_id]]
+        if succ[a_id] < 0:
+            return None
+
+        path = [a_id]
+        while path[-1] != b_id:
+            path.append(succ[path[-1]])
+        return path
+
+    def lower_bound(self, v, b_id):
+        """
+        Lower bound on the wins v needs to reach Fighter B, UNREACHABLE
+        when the tables prove there is no path
+        """
+        bound = 0
+
+        for k in range(len(self.landmarks)):
+            fwd = self.fwd_dist[k]
+            if fwd[v] >= 0:
+                # Landmark reaches v, so it reaches anything v can beat
+                if fwd[b_id] < 0:
+                    return UNREACHABLE
+                bound = max(bound, fwd[b_id] - fwd[v])
+
+            bwd = self.bwd_dist[k]
+            if bwd[b_id] >= 0:
+                # B reaches the landmark, so anything beating B does too
+                if bwd[v] < 0:
+                    return UNREACHABLE
+                bound = max(bound, bwd[v] - bwd[b_id])
+
+        return bound
+
+    def upper_bound(self, a_id, b_id):
+        """
+        Shortest path from Fighter A to Fighter B through a landmark
+        :return tuple: Length and landmark slot, UNREACHABLE if none
+        """
+        best = UNREACHABLE, None
+
+        for k in range(len(self.landmarks)):
+            to_landmark = self.bwd_dist[k][a_id]
+            from_landmark = self.fwd_dist[k][b_id]
+
+            if to_landmark >= 0 and from_landmark >= 0:
+                best = min(best, (to_landmark + from_landmark, k))
+
+        return best
+
+
+def pick_landmarks(graph, count):
+    """
+    Fighters with the most recorded fights, who sit at the center of
+    most win paths
+    """
+    offsets, targets, loss_offsets, loss_targets = graph.csr
+    degree = [(offsets[f_id + 1] - offsets[f_id]) +
+              (loss_offsets[f_id + 1] - loss_offsets[f_id])
+              for f_id in range(len(offsets) - 1)]
+
+    return sorted(range(len(degree)), key=degree.__getitem__,
+                  reverse=True)[:count]
+
+
+def build_landmarks(graph, count=16, names=None):
+    """
+    Run a forward and backward BFS from each landmark
+    :param WinGraph graph: Preloaded win graph
+    :param int count: Landmarks to pick when names is None
+    :param list names: Fighters to use as landmarks, e.g. most queried
+    :return: LandmarkIndex
+    """
+    if names is None:
+        landmarks = pick_landmarks(graph, count)
+    else:
+        landmarks = [graph.fighter_id(name) for name in names
+                     if graph.fighter_id(name) is not None]
+
+    offsets, targets, loss_offsets, loss_targets = graph.csr
+    fwd_dist, fwd_prev, bwd_dist, bwd_next = [], [], [], []
+
+    for f_id in landmarks:
+        dist, prev = bfs_tree(offsets, targets, f_id)
+        fwd_dist.append(dist)
+        fwd_prev.append(prev)
+
+        dist, succ = bfs_tree(loss_offsets, loss_targets, f_id)
+        bwd_dist.append(dist)
+        bwd_next.append(succ)
+
+    return LandmarkIndex(landmarks, fwd_dist, fwd_prev, bwd_dist, bwd_next,
+                         len(offsets) - 1, len(targets), csr_checksum(graph),
+                         graph.version)
+
+
+def landmark_steps(graph, a_id, b_id, fallback=None, check=None):
+    """
+    Answer from the landmark tables when possible and only search when
+    the tables cannot settle the query. Like the other engines this is a
+    generator, it yields the fallback's progress when it has to search
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param int b_id: Id of fighter B
+    :param fallback: Search generator used when the tables can't answer
+    :param check: Passed on to the fallback search
+    :return: Generator returning fighter ids along the shortest path,
+             None if no path
+    """
+    index = graph.landmarks
+
+    if index is None or not index.matches(graph):
+        return (yield from fallback(graph, a_id, b_id, check=check))
+
+    if index.covers(a_id, b_id):
+        return index.lookup(a_id, b_id)
+
+    lower = index.lower_bound(a_id, b_id)
+    if lower == UNREACHABLE:
+        return None
+
+    upper, k = index.upper_bound(a_id, b_id)
+    if upper == lower:
+        landmark = index.landmarks[k]
+        return index.lookup(a_id, landmark)[:-1] + \
+            index.lookup(landmark, b_id)
+
+    return (yield from fallback(graph, a_id, b_id, check=check))
+
+
+def write_landmarks(index, landmark_file=LANDMARK_FILE):
+    with open(landmark_file, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, index.n_names, index.n_edges,
+                               index.checksum, len(index.landmarks)))
+        file.write(array('i', index.landmarks).tobytes())
+
+        for k in range(len(index.landmarks)):
+            for table in (index.fwd_dist, index.fwd_prev,
+                          index.bwd_dist, index.bwd_next):
+                file.write(table[k].tobytes())
+
+    print(f"Landmarks written to {landmark_file}")
+
+
+def load_landmarks(graph, landmark_file=LANDMARK_FILE):
+    """
+    Load tables written by write_landmarks
+    :param WinGraph graph: Graph the tables must have been built from
+    :param str landmark_file: File to read
+    :return: LandmarkIndex, None if missing or built from another graph
+    """
+    try:
+        with open(landmark_file, 'rb') as file:
+            magic, version, n_names, n_edges, checksum, count = \
+                HEADER.unpack(file.read(HEADER.size))
+
+            if magic != MAGIC or version != VERSION:
+                return None
+
+            # Same shape with different fights, e.g. a corrected result
+            if (n_names != len(graph.offsets) - 1 or
+                    n_edges != len(graph.targets) or
+                    checksum != csr_checksum(graph)):
+                return None
+
+            landmarks = array('i')
+            landmarks.fromfile(file, count)
+            tables = ([], [], [], [])
+
+            for k in range(count):
+                for table in tables:
+                    column = array('i')
+                    column.fromfile(file, n_names)
+                    table.append(column)
+
+    except (FileNotFoundError, EOFError, struct.error):
+        return None
+
+    return LandmarkIndex(list(landmarks), *tables, n_names, n_edges,
+                         checksum, graph.version)
+
+
+def main():
+    from scripts.name_index import NameIndex
+    from scripts.path_finder import load_win_graph
+
+    path = Path(__file__).parent
+    name_index = NameIndex.from_file(path / "../data/urls/name_url.tsv")
+    write_landmarks(build_landmarks(load_win_graph(name_index)))
+
+
+if __name__ == '__main__':
+    main()
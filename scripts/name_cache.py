@@ -0,0 +1,64 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import os
+import pickle
+from pathlib import Path
+
+NAME_CACHE = Path(__file__).parent / "../data/cache/names.pickle"
+
+# Bump when NameIndex or NameSearch change shape
+FORMAT = 3
+
+
+def file_signature(files):
+    """
+    :param list files: Files a payload is derived from
+    :return tuple: Path, mtime and size of each, None for missing files
+    """
+    signature = []
+
+    for file in files:
+        try:
+            stat = os.stat(file)
+            signature.append((str(file), stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append((str(file), None, None))
+
+    return tuple(signature)
+
+
+def cached_payload(build, sources, cache_file=NAME_CACHE):
+    """
+    Load a payload pickled by an earlier start, or build and pickle it
+    when it is missing or any of its source files changed. Loading the
+    name and suggestion indexes this way takes milliseconds where
+    building them from name_url.tsv takes most of a second
+    :param build: Zero argument function producing the payload
+    :param list sources: Files the payload is derived from
+    :param str cache_file: Pickle to read and write
+    :return: Payload
+    """
+    signature = (FORMAT, file_signature(sources))
+
+    try:
+        with open(cache_file, 'rb') as file:
+            if pickle.load(file) == signature:
+                return pickle.load(file)
+
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError,
+            AttributeError, ImportError):
+        pass
+
+    payload = build()
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = Path(f"{cache_file}.tmp")
+
+    with open(tmp_file, 'wb') as file:
+        pickle.dump(signature, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(tmp_file, cache_file)
+    return payload
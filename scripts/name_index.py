@@ -0,0 +1,251 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import re
+from collections import Counter
+from pathlib import Path
+
+from scripts.name_search import normalize
+
+RECORD_DIR = Path(__file__).parent / "../data/fighters"
+
+NICKNAME = re.compile(r'["\u201c\u201d(][^"\u201c\u201d()]*["\u201c\u201d)]')
+
+
+def name_key(name):
+    """
+    Key that spellings of the same fighter share. Nicknames, accents,
+    case, punctuation and token order are ignored, so
+    'Jose "Shorty" Garcia-Lopez Jr.' and 'lopez garcia jose jr' match.
+    Suffixes are kept, a Jr. is a different fighter from his father
+    :param str name: Fighter name
+    :return str:
+    """
+    text = normalize(NICKNAME.sub(' ', name))
+    tokens = re.sub(r'\W+', ' ', re.sub(r"['\u2019.]", '', text)).split()
+    return ' '.join(sorted(tokens))
+
+
+def add_key(keys, name):
+    """
+    Map name's key to name, keys shared by differently named fighters
+    map to None so they never resolve
+    :param dict keys: name_key to name
+    :param str name: Fighter name
+    """
+    key = name_key(name)
+    first = keys.setdefault(key, name)
+    if first is not None and first != name:
+        keys[key] = None
+
+
+class NodeIndex:
+    """
+    Node id of every name in a win graph, the one mapping used when
+    records are loaded, stored and patched. names holds the listed
+    fighters first and then opponents in the order records name them.
+    A name resolves exactly first and then by name_key, a key shared by
+    differently named fighters matches neither of them. Opponents that
+    don't resolve are added as new nodes
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.index = {}
+        self.aliases = None
+
+        for f_id, name in enumerate(names):
+            self.index.setdefault(name, f_id)
+
+    def get(self, name):
+        """
+        :param str name: Fighter name
+        :return int: Node id, None if no node matches
+        """
+        if not isinstance(name, str):
+            return None
+
+        f_id = self.index.get(name)
+        if f_id is not None:
+            return f_id
+
+        # Only built once an inexact name shows up
+        if self.aliases is None:
+            keys = {}
+            for known in self.names:
+                add_key(keys, known)
+            self.aliases = {key: None if known is None else self.index[known]
+                            for key, known in keys.items()}
+
+        return self.aliases.get(name_key(name))
+
+    def intern(self, name):
+        """
+        :param str name: Fighter name
+        :return int: Node id, added after every other node if no node
+                     matches
+        """
+        f_id = self.get(name)
+        if f_id is None:
+            f_id = len(self.names)
+            self.names.append(name)
+            self.index[name] = f_id
+            self.aliases.setdefault(name_key(name), f_id)
+        return f_id
+
+
+def link_to_id(link):
+    """
+    ESPN fighter id embedded in a fighter url (/id/3043549/)
+    :param str link: Fighter url
+    :return int: Fighter id, None if link has no id
+    """
+    try:
+        return int(link.split('id/')[1].split('/')[0])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class NameIndex:
+    """
+    Hashed lookup from fighter name to link, slug and record file.
+    Only the first link listed for a name is kept, matching name_to_url.
+    Names that don't match exactly fall back to their name_key, unless
+    differently named fighters share that key, e.g. 'Ali Mohamed' and
+    'Mohamed Ali', in which case the name doesn't resolve at all.
+
+    fighters holds every listed fighter by ESPN id, duplicate names
+    included, as (name, link, slug, own_slug). Records are stored per
+    ESPN id as {slug}-{espn_id}.tsv. Records scraped before that are
+    {slug}.tsv and are only read for a fighter whose slug no other
+    listed fighter shares (own_slug), since there is no telling whose
+    record a shared file holds. Record file paths are built on demand,
+    which keeps the index plain strings and quick to pickle
+    """
+
+    def __init__(self, entries, fighters=None, record_dir=RECORD_DIR):
+        self.entries = entries
+        self.fighters = fighters or {}
+        self.record_dir = Path(record_dir)
+        self.keys = {}
+
+        for name in entries:
+            add_key(self.keys, name)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def names(self):
+        return list(self.entries)
+
+    def resolve(self, name):
+        """
+        :param str name: Fighter name as typed or as listed in a record,
+                         blank record cells are read as NaN
+        :return str: Canonical name, None if no fighter matches
+        """
+        if not isinstance(name, str):
+            return None
+
+        if name in self.entries:
+            return name
+
+        return self.keys.get(name_key(name))
+
+    def espn_id(self, name):
+        return link_to_id(self.url(name))
+
+    def url(self, fighter):
+        """
+        :param fighter: ESPN id, or a name for the first fighter listed
+                        with it
+        :return str: Fighter url, None if unknown
+        """
+        if isinstance(fighter, int):
+            entry = self.fighters.get(fighter)
+            return None if entry is None else entry[1]
+
+        entry = self.entries.get(self.resolve(fighter))
+        return None if entry is None else entry[0]
+
+    def fighter_name(self, espn_id):
+        entry = self.fighters.get(espn_id)
+        return None if entry is None else entry[0]
+
+    def slug(self, name):
+        entry = self.entries.get(self.resolve(name))
+        return None if entry is None else entry[1]
+
+    def slug_file(self, slug):
+        return self.record_dir / f"{slug[0]}-fighters/{slug}.tsv"
+
+    def id_file(self, espn_id):
+        """
+        :return Path: File a listed fighter's record is written to
+        """
+        entry = self.fighters.get(espn_id)
+        return None if entry is None else \
+            self.slug_file(f"{entry[2]}-{espn_id}")
+
+    def fighter_file(self, espn_id):
+        """
+        :return Path: File a listed fighter's record is read from, the
+                      id file or, until it is written, an unshared
+                      {slug}.tsv from before records were kept by id
+        """
+        fight_file = self.id_file(espn_id)
+        if fight_file is None:
+            return None
+
+        slug, own_slug = self.fighters[espn_id][2:]
+        if own_slug and not fight_file.exists():
+            return self.slug_file(slug)
+        return fight_file
+
+    def record_file(self, name):
+        return self.fighter_file(self.espn_id(name))
+
+    def fighter_files(self):
+        """
+        :return list: Record file of every fighter in fighters order
+        """
+        return [self.fighter_file(espn_id) for espn_id in self.fighters]
+
+    @classmethod
+    def from_file(cls, name_urls, record_dir=RECORD_DIR):
+        """
+        Build index from name_url.tsv
+        :param str name_urls: File containing fighter names and urls
+        :param str record_dir: Directory containing {initial}-fighters/
+        :return: NameIndex
+        """
+        entries = {}
+        listed = {}
+        slugs = Counter()
+
+        with open(name_urls, 'r', encoding='utf-8') as file:
+            for line in file:
+                name, link = line.rstrip('\n').split('\t')
+                file_pre = link.split('/')[-1]
+
+                if name not in entries:
+                    entries[name] = (link, file_pre)
+
+                espn_id = link_to_id(link)
+                if espn_id not in listed:
+                    listed[espn_id] = (name, link, file_pre)
+                    slugs[file_pre] += 1
+
+        fighters = {espn_id: (name, link, file_pre, slugs[file_pre] == 1)
+                    for espn_id, (name, link, file_pre) in listed.items()}
+
+        return cls(entries, fighters, record_dir)
@@ -0,0 +1,87 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import heapq
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+
+def normalize(text):
+    """
+    Case and accent folded form of a name, 'Iván' -> 'ivan'
+    :param str text:
+    :return str:
+    """
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameSearch:
+    """
+    Typeahead index over fighter names. Queries match the start of the
+    full name or of any later name token ('mcg' finds Conor McGregor),
+    ranked by weight. When there are too few prefix matches the rest
+    are filled by trigram similarity to catch typos
+    """
+
+    def __init__(self, names, weights=None):
+        self.names = list(names)
+        self.weights = weights or {}
+        keys = []
+        grams = defaultdict(list)
+
+        for f_id, name in enumerate(self.names):
+            norm = normalize(name)
+            keys.append((norm, f_id))
+
+            for token in norm.split()[1:]:
+                keys.append((token, f_id))
+
+            for gram in trigrams(norm):
+                grams[gram].append(f_id)
+
+        keys.sort()
+        self.keys = [key for key, f_id in keys]
+        self.ids = [f_id for key, f_id in keys]
+        self.grams = dict(grams)
+
+    def rank(self, f_id):
+        name = self.names[f_id]
+        return -self.weights.get(name, 0), len(name), name
+
+    def suggest(self, query, limit=10):
+        """
+        :param str query: Text typed so far
+        :param int limit: Most suggestions to return
+        :return list: Fighter names, best match first
+        """
+        norm = normalize(query or '').strip()
+        if len(norm) == 0:
+            return []
+
+        start = bisect_left(self.keys, norm)
+        end = bisect_left(self.keys, norm + '\uffff')
+        matches = heapq.nsmallest(limit, set(self.ids[start:end]),
+                                  key=self.rank)
+
+        if len(matches) < limit and len(norm) >= 3:
+            shared = Counter()
+            for gram in trigrams(norm):
+                shared.update(self.grams.get(gram, ()))
+
+            for f_id in matches:
+                shared.pop(f_id, None)
+
+            matches += heapq.nsmallest(
+                limit - len(matches), shared,
+                key=lambda f_id: (-shared[f_id],) + self.rank(f_id))
+
+        return [self.names[f_id] for f_id in matches]
@@ -5,14 +5,21 @@ Python Version: 3.7
 
 import sys
 from _collections import deque
+from array import array
+from functools import partial
 from pathlib import Path
 
-import pandas as pd
-
-from scripts.stat_finder import name_to_url
+from scripts.components import component_index, component_steps
+from scripts.landmarks import landmark_steps, load_landmarks
+from scripts.name_index import NameIndex
+from scripts.record_store import RecordStore, STORE_FILE
+from scripts.tree_cache import TreeCache, tree_levels, tree_path
+from scripts.win_graph import WinGraph
 
 
 class FightGraph:
+    __slots__ = ('graph', 'prev', 'dist', 'path_found', 'shortest')
+
     def __init__(self):
         self.graph = {}
         self.prev = {}
@@ -25,6 +32,8 @@ class FightGraph:
 
 
 def get_wins(fight_file):
+    import pandas as pd
+
     try:
         if fight_file is None:
             return None
@@ -42,6 +51,8 @@ def get_wins(fight_file):
 
 
 def get_losses(fight_file):
+    import pandas as pd
+
     try:
         df = pd.read_csv(fight_file, sep='\t',
                          usecols=[0, 1], names=['opponent', 'res'])
@@ -53,6 +64,11 @@ def get_losses(fight_file):
 
 
 def name_to_file(df, name):
+    if isinstance(df, NameIndex):
+        return df.record_file(name)
+
+    from scripts.stat_finder import name_to_url
+
     path = Path(__file__).parent
     link = name_to_url(df, name)
     if link is None:
@@ -63,11 +79,12 @@ def name_to_file(df, name):
         return path / f"../data/fighters/{f_initial}-fighters/{file_pre}.tsv"
 
 
-def make_graph(db, fighter_a, fighter_b):
+def make_graph(db, fighter_a, fighter_b, check=None):
     """
     Creates a graph seeing if Fighter A can beat Fighter B
     :param str fighter_a: Name of fighter
     :param str fighter_b: Name of fighter
+    :param check: Called once per fighter, raises to stop the search
     :return: FighterGraph
     """
 
@@ -91,6 +108,9 @@ def make_graph(db, fighter_a, fighter_b):
     while len(to_add) > 0:
         curr_fighter = to_add.popleft()
 
+        if check is not None:
+            check()
+
         fighter_wins = get_wins(name_to_file(db, curr_fighter))
 
         if fighter_wins is None or len(fighter_wins) < 1:
@@ -129,6 +149,349 @@ def make_graph(db, fighter_a, fighter_b):
         return None
 
 
+class SearchState:
+    """
+    One side of a search over a WinGraph, held in int32 arrays indexed
+    by fighter id instead of dicts keyed by name. A dist of -1 marks a
+    fighter not reached yet, so dist doubles as the visited set
+    """
+    __slots__ = ('prev', 'dist', 'visited')
+
+    def __init__(self, size, source):
+        self.prev = array('i', [-1]) * size
+        self.dist = array('i', [-1]) * size
+        self.prev[source] = source
+        self.dist[source] = 0
+        self.visited = 1
+
+
+def search_event(depth, frontier, visited, path=None):
+    return {'depth': depth, 'frontier': frontier,
+            'visited': visited, 'path': path}
+
+
+def forward_steps(graph, a_id, b_id, check=None, prune=False):
+    """
+    Breadth first search over wins from Fighter A, one level at a time
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param int b_id: Id of fighter B
+    :param check: Called once per fighter, raises to stop the search
+    :param bool prune: Skip fighters whose strongly connected component
+                       can't lead to Fighter B
+    :return: Generator yielding a search_event per level, returns fighter
+             ids along the shortest path, None if no path
+    """
+    offsets, targets = graph.csr[:2]
+    state = SearchState(len(offsets) - 1, a_id)
+    prev, dist = state.prev, state.dist
+    frontier = [a_id]
+    depth = 0
+
+    if prune:
+        index = component_index(graph)
+        comp, reach, goal = index.comp, index.reach, \
+            index.goal[index.comp[b_id]]
+    else:
+        goal = None
+
+    while len(frontier) > 0:
+        next_frontier = []
+        depth += 1
+
+        for curr_fighter in frontier:
+            if check is not None:
+                check()
+
+            for i in targets[offsets[curr_fighter]:offsets[curr_fighter + 1]]:
+                if dist[i] < 0:
+                    if goal is not None and i != b_id and \
+                            reach[comp[i]] & goal == 0:
+                        continue
+
+                    prev[i] = curr_fighter
+                    dist[i] = depth
+                    state.visited += 1
+
+                    if i == b_id:
+                        path = walk_prev(prev, a_id, b_id)
+                        yield search_event(depth, len(next_frontier),
+                                           state.visited, path)
+                        return path
+
+                    next_frontier.append(i)
+
+        frontier = next_frontier
+        yield search_event(depth, len(frontier), state.visited)
+
+    return None
+
+
+def bidirectional_steps(graph, a_id, b_id, check=None):
+    """
+    Expand forward from Fighter A over wins and backward from Fighter B
+    over losses one level at a time, always growing the smaller frontier,
+    until both searches meet
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param int b_id: Id of fighter B
+    :param check: Called once per fighter, raises to stop the search
+    :return: Generator yielding a search_event per level, returns fighter
+             ids along the shortest path, None if no path
+    """
+    win_offsets, win_targets, loss_offsets, loss_targets = graph.csr
+    forward = SearchState(len(win_offsets) - 1, a_id)
+    backward = SearchState(len(win_offsets) - 1, b_id)
+    frontier_a = [a_id]
+    frontier_b = [b_id]
+    depth = 0
+
+    while len(frontier_a) > 0 and len(frontier_b) > 0:
+        if len(frontier_a) <= len(frontier_b):
+            offsets, targets = win_offsets, win_targets
+            frontier, state, other = frontier_a, forward, backward
+        else:
+            offsets, targets = loss_offsets, loss_targets
+            frontier, state, other = frontier_b, backward, forward
+
+        parent, dist, other_dist = state.prev, state.dist, other.dist
+        next_frontier = []
+        best = None
+        best_len = sys.maxsize
+        depth += 1
+
+        for curr_fighter in frontier:
+            if check is not None:
+                check()
+
+            next_dist = dist[curr_fighter] + 1
+
+            for i in targets[offsets[curr_fighter]:offsets[curr_fighter + 1]]:
+                if dist[i] < 0:
+                    parent[i] = curr_fighter
+                    dist[i] = next_dist
+                    next_frontier.append(i)
+
+                    if 0 <= other_dist[i] < best_len - next_dist:
+                        best = i
+                        best_len = next_dist + other_dist[i]
+
+        state.visited += len(next_frontier)
+
+        if frontier is frontier_a:
+            frontier_a = next_frontier
+        else:
+            frontier_b = next_frontier
+
+        if best is not None:
+            path = walk_prev(forward.prev, a_id, best)
+            path.extend(reversed(walk_prev(backward.prev, b_id, best)[:-1]))
+            yield search_event(depth, len(frontier_a) + len(frontier_b),
+                               forward.visited + backward.visited, path)
+            return path
+
+        yield search_event(depth, len(frontier_a) + len(frontier_b),
+                           forward.visited + backward.visited)
+
+    return None
+
+
+def expand_frontier(offsets, targets, frontier):
+    """
+    Every win of every fighter in the frontier in one gather
+    :return tuple: Beaten fighter ids and the frontier fighter that won
+    """
+    import numpy as np
+
+    starts = offsets[frontier].astype(np.int64)
+    counts = offsets[frontier + 1].astype(np.int64) - starts
+    edge_starts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+
+    return (targets[edge_starts + np.arange(counts.sum())],
+            np.repeat(frontier, counts))
+
+
+def matrix_steps(graph, a_id, b_id, check=None):
+    """
+    Level synchronous breadth first search from Fighter A using NumPy
+    views of the CSR arrays, each level is expanded with vectorized
+    gathers instead of a Python loop per fighter
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param int b_id: Id of fighter B
+    :param check: Called once per level, raises to stop the search
+    :return: Generator yielding a search_event per level, returns fighter
+             ids along the shortest path, None if no path
+    """
+    import numpy as np
+
+    offsets, targets = (np.asarray(csr) for csr in graph.csr[:2])
+    parent = np.full(len(offsets) - 1, -1, dtype=np.int32)
+    parent[a_id] = a_id
+    frontier = np.array([a_id], dtype=np.int64)
+    visited = 1
+    depth = 0
+
+    while frontier.size > 0:
+        if check is not None:
+            check()
+
+        depth += 1
+        beaten, winners = expand_frontier(offsets, targets, frontier)
+        unseen = parent[beaten] < 0
+        frontier, first = np.unique(beaten[unseen], return_index=True)
+        parent[frontier] = winners[unseen][first]
+        visited += frontier.size
+
+        if parent[b_id] >= 0:
+            path = walk_prev(parent.tolist(), a_id, b_id)
+            yield search_event(depth, int(frontier.size), visited, path)
+            return path
+
+        yield search_event(depth, int(frontier.size), visited)
+
+    return None
+
+
+def tree_steps(graph, a_id, b_id, check=None):
+    """
+    Read the path off Fighter A's full BFS tree. The tree is kept in
+    graph.trees, so every later query from the same challenger is a
+    walk up the tree with no search
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param int b_id: Id of fighter B
+    :param check: Called once per level searched, raises to stop
+    :return: Generator yielding a search_event per level searched and
+             one with the path, returns fighter ids along the shortest
+             path, None if no path
+    """
+    if check is not None:
+        check()
+
+    levels = tree_levels(graph, a_id, check)
+    visited = 0
+
+    while True:
+        try:
+            depth, frontier, visited = next(levels)
+        except StopIteration as done:
+            parent = done.value[1]
+            break
+
+        yield search_event(depth, frontier, visited)
+
+    path = tree_path(parent, a_id, b_id)
+    yield search_event(0 if path is None else len(path) - 1, 0, visited,
+                       path)
+    return path
+
+
+def run_steps(steps, progress=None):
+    """
+    Drive a search generator to the end
+    :param steps: Generator from one of SEARCH_ENGINES
+    :param progress: Called with every search_event
+    :return: Value returned by the generator
+    """
+    while True:
+        try:
+            event = next(steps)
+        except StopIteration as done:
+            return done.value
+
+        if progress is not None:
+            progress(event)
+
+
+def walk_prev(prev, start, end):
+    path = [end]
+
+    while end != start:
+        end = prev[end]
+        path.append(end)
+
+    path.reverse()
+    return path
+
+
+SEARCH_ENGINES = {
+    'forward': forward_steps,
+    'bidirectional': bidirectional_steps,
+    'matrix': matrix_steps,
+    'pruned': partial(forward_steps, prune=True),
+    'component': partial(component_steps, fallback=bidirectional_steps),
+    'landmark': partial(landmark_steps,
+                        fallback=partial(component_steps,
+                                         fallback=bidirectional_steps)),
+    'tree': tree_steps,
+    'cached': partial(landmark_steps,
+                      fallback=partial(component_steps, fallback=tree_steps)),
+}
+
+
+def search_graph(graph, a_id, b_id, engine='forward', check=None,
+                 progress=None):
+    """
+    Creates a graph seeing if Fighter A can beat Fighter B using
+    an in memory WinGraph instead of reading records from disk
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Node id of Fighter A
+    :param int b_id: Node id of Fighter B
+    :param str engine: Key of SEARCH_ENGINES to run
+    :param check: Called once per fighter, raises to stop the search
+    :param progress: Called with a search_event after every level, the
+                     path in the event is given as graph.fighter keys
+    :return: FightGraph keyed by node id
+    """
+
+    if (a_id is None) or (b_id is None):
+        return None
+
+    if not graph.has_losses(b_id):
+        print('No path, fighter is undefeated')
+        return None
+
+    if a_id == b_id:
+        print(f'{graph.names[a_id]} can beat {graph.names[b_id]}')
+        return None
+
+    print('Finding path...')
+    def report(event):
+        if event['path'] is not None:
+            event['path'] = [graph.fighter(f_id) for f_id in event['path']]
+        progress(event)
+
+    path_ids = run_steps(SEARCH_ENGINES[engine](graph, a_id, b_id,
+                                                check=check),
+                         None if progress is None else report)
+
+    if path_ids is None:
+        print('No path to victory found')
+        return None
+
+    print(f"Path found with length {len(path_ids) - 1}")
+    return ids_to_graph(path_ids)
+
+
+def ids_to_graph(path_ids):
+    """
+    Wrap a path of node ids in a FightGraph so get_path can walk it
+    :param list path_ids: Node ids from Fighter A to Fighter B
+    :return: FightGraph
+    """
+    fight_history = FightGraph()
+    fight_history.path_found = True
+    fight_history.shortest = len(path_ids) - 1
+    fight_history.dist[path_ids[0]] = 0
+
+    for dist, (prev_id, f_id) in enumerate(zip(path_ids, path_ids[1:]), 1):
+        fight_history.prev[f_id] = prev_id
+        fight_history.dist[f_id] = dist
+
+    return fight_history
+
+
 def get_path(f_graph, fighter_a, fighter_b):
     path = []
     curr_fighter = fighter_b
@@ -142,13 +505,62 @@ def get_path(f_graph, fighter_a, fighter_b):
     return path
 
 
-def mma_math(db, fighter_a, fighter_b):
-    graph = make_graph(db, fighter_a, fighter_b)
+def load_win_graph(name_index, store_file=STORE_FILE):
+    """
+    Map the consolidated record store if it exists, otherwise fall back
+    to reading every record in data/fighters. Landmark tables built for
+    the same graph are attached when present, along with an empty
+    cache of BFS trees
+    :param NameIndex name_index: Index of fighters with records
+    :param str store_file: Record store written by write_store
+    :return: WinGraph
+    """
+    try:
+        graph = RecordStore(store_file).win_graph()
+
+    except (FileNotFoundError, ValueError):
+        graph = WinGraph.from_records(name_index)
+
+    graph.landmarks = load_landmarks(graph)
+    graph.trees = TreeCache()
+    return graph
+
+
+def mma_math(db, fighter_a, fighter_b, win_graph=None, engine='forward',
+             check=None, progress=None):
+    """
+    Fighters are ESPN ids or names. Names are turned into ESPN ids here
+    and into node ids by the graph, so the search itself never compares
+    names and fighters sharing a name stay apart
+    :return list: Fighters along the path, as ESPN ids when searching a
+                  win_graph and as names otherwise, None if no path
+    """
+    if win_graph is None:
+        if isinstance(db, NameIndex):
+            fighter_a, fighter_b = [db.fighter_name(fighter)
+                                    if isinstance(fighter, int) else
+                                    db.resolve(fighter)
+                                    for fighter in (fighter_a, fighter_b)]
+
+        graph = make_graph(db, fighter_a, fighter_b, check)
+        return None if graph is None else get_path(graph, fighter_a,
+                                                   fighter_b)
+
+    if isinstance(db, NameIndex):
+        fighter_a, fighter_b = [fighter if isinstance(fighter, int) else
+                                db.espn_id(fighter)
+                                for fighter in (fighter_a, fighter_b)]
+
+    a_id = win_graph.node(fighter_a)
+    b_id = win_graph.node(fighter_b)
+
+    graph = search_graph(win_graph, a_id, b_id, engine, check, progress)
 
     if graph is None:
         return None
     else:
-        return get_path(graph, fighter_a, fighter_b)
+        return [win_graph.fighter(f_id)
+                for f_id in get_path(graph, a_id, b_id)]
 
 
 def main():
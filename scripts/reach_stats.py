@@ -0,0 +1,118 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import os
+from multiprocessing import Pool
+from pathlib import Path
+
+from scripts.record_store import RecordStore, STORE_FILE
+
+REACH_FILE = Path(__file__).parent / "../data/reach_stats.tsv"
+SWEEP_WORKERS = os.cpu_count() or 1
+COLUMNS = ['name', 'espn_id', 'reachable', 'depth', 'mean_depth', 'levels']
+
+# Record store mapped by each worker process
+worker_store = None
+
+
+def reach_levels(offsets, targets, source, seen):
+    """
+    Breadth first search over wins counting fighters per level
+    :param offsets: CSR offsets
+    :param targets: CSR targets
+    :param int source: Fighter id to search from
+    :param bytearray seen: One zeroed byte per fighter, cleared on return
+    :return list: Fighters first beaten at depth 1, 2, ...
+    """
+    seen[source] = 1
+    reached = [source]
+    frontier = [source]
+    levels = []
+
+    while len(frontier) > 0:
+        next_frontier = []
+
+        for curr_fighter in frontier:
+            for i in targets[offsets[curr_fighter]:offsets[curr_fighter + 1]]:
+                if not seen[i]:
+                    seen[i] = 1
+                    next_frontier.append(i)
+
+        if len(next_frontier) > 0:
+            levels.append(len(next_frontier))
+            reached.extend(next_frontier)
+        frontier = next_frontier
+
+    for f_id in reached:
+        seen[f_id] = 0
+
+    return levels
+
+
+def init_worker(store_file):
+    global worker_store
+    worker_store = RecordStore(store_file)
+
+
+def sweep_rows(sources):
+    """
+    :param range sources: Fighter ids to search from
+    :return list: One tsv line per fighter
+    """
+    store = worker_store
+    offsets, targets = store.win_offsets, store.win_targets
+    seen = bytearray(len(offsets) - 1)
+    lines = []
+
+    for f_id in sources:
+        levels = reach_levels(offsets, targets, f_id, seen)
+        reachable = sum(levels)
+        total_depth = sum(depth * count
+                          for depth, count in enumerate(levels, 1))
+        espn_id = store.espn_ids[f_id] if f_id < store.n_records else ''
+
+        lines.append(f"{store.names[f_id]}\t{espn_id}\t{reachable}\t"
+                     f"{len(levels)}\t"
+                     f"{round(total_depth / reachable, 3) if reachable else 0}"
+                     f"\t{','.join(map(str, levels))}\n")
+
+    return lines
+
+
+def sweep(store_file=STORE_FILE, out_file=REACH_FILE, workers=SWEEP_WORKERS,
+          chunk=256):
+    """
+    Run a BFS from every fighter and write how many fighters each can
+    transitively beat and at what depths. Workers map the record store
+    themselves, so only fighter id ranges and finished lines cross
+    process boundaries, and lines are written as chunks complete
+    :param str store_file: Record store written by write_store
+    :param str out_file: TSV to write
+    :param int workers: Processes to use
+    :param int chunk: Sources per task
+    """
+    n_names = len(RecordStore(store_file).names)
+    chunks = [range(start, min(start + chunk, n_names))
+              for start in range(0, n_names, chunk)]
+
+    with Pool(workers, initializer=init_worker,
+              initargs=(store_file,)) as pool, \
+            open(out_file, 'w', encoding='utf-8') as file:
+        file.write('\t'.join(COLUMNS) + '\n')
+
+        for done, lines in enumerate(pool.imap_unordered(sweep_rows, chunks),
+                                     1):
+            file.writelines(lines)
+            print(f"{done}/{len(chunks)} chunks written")
+
+    print(f"Reachability written to {out_file}")
+
+
+def main():
+    sweep()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from scripts.name_index import NodeIndex
+from scripts.win_graph import WinGraph, reverse_edges
+
+STORE_FILE = Path(__file__).parent / "../data/records.bin"
+
+MAGIC = b'MMAR'
+VERSION = 3
+HEADER = struct.Struct('<4sIIIII')
+
+"""
+Layout after the header, every section 4 byte aligned and little endian:
+    fight_offsets   uint32[n_records + 1]
+    fight_opponents uint32[n_fights]
+    win_offsets     uint32[n_names + 1]
+    win_targets     uint32[n_wins]
+    loss_offsets    uint32[n_names + 1]
+    loss_targets    uint32[n_wins]
+    loss_count      uint32[n_names]
+    espn_ids        uint32[n_records]
+    fight_results   uint8[n_fights]   ('W', 'L', 'D')
+    string table    utf-8 names joined by newlines
+
+Fighter ids index the string table. The first n_records ids are the
+listed fighters in NameIndex.fighters order, every later id is an
+opponent only.
+Opponents are resolved by NodeIndex when written, the same mapping
+WinGraph.from_records uses, so fight_opponents always points at the
+fighter's canonical id
+"""
+
+
+def read_record(fight_file):
+    """
+    Read a fighter's record without pandas
+    :param fight_file: Path to fighter tsv
+    :return list: (opponent, result) pairs, None if record is missing
+    """
+    try:
+        with open(fight_file, 'r', encoding='utf-8') as file:
+            return [tuple(line.rstrip('\n').split('\t')[:2]) for line in file]
+
+    except (FileNotFoundError, TypeError):
+        return None
+
+
+def write_store(name_index, store_file=STORE_FILE):
+    """
+    Convert the data/fighters tree into a single record store
+    :param NameIndex name_index: Index of fighters with records
+    :param str store_file: File to write
+    """
+    names = [entry[0] for entry in name_index.fighters.values()]
+    records = name_index.fighter_files()
+    name_ids = NodeIndex(names)
+    n_records = len(names)
+
+    fight_offsets = array('I', [0])
+    fight_opponents = array('I')
+    fight_results = bytearray()
+
+    for fight_file in records:
+        for opponent, res in read_record(fight_file) or []:
+            fight_opponents.append(name_ids.intern(opponent))
+            fight_results.append(ord(res[0]))
+
+        fight_offsets.append(len(fight_opponents))
+
+    win_offsets = array('I', [0])
+    win_targets = array('I')
+    loss_count = array('I', [0]) * len(names)
+
+    for f_id in range(len(names)):
+        if f_id < n_records:
+            for i in range(fight_offsets[f_id], fight_offsets[f_id + 1]):
+                if fight_results[i] == ord('W'):
+                    win_targets.append(fight_opponents[i])
+                else:
+                    loss_count[f_id] += 1
+
+        win_offsets.append(len(win_targets))
+
+    loss_offsets, loss_targets = reverse_edges(win_offsets, win_targets)
+    loss_offsets = array('I', loss_offsets)
+    loss_targets = array('I', loss_targets)
+
+    sections = [fight_offsets, fight_opponents, win_offsets, win_targets,
+                loss_offsets, loss_targets, loss_count,
+                array('I', name_index.fighters)]
+
+    if sys.byteorder == 'big':
+        for section in sections:
+            section.byteswap()
+
+    # Write beside the old store and swap it in, so processes that still
+    # map the old file keep reading a complete copy
+    tmp_file = Path(f"{store_file}.tmp")
+
+    with open(tmp_file, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(names), n_records,
+                               len(fight_opponents), len(win_targets)))
+
+        for section in sections:
+            file.write(section.tobytes())
+
+        file.write(fight_results)
+        file.write(b'\0' * (-len(fight_results) % 4))
+        file.write('\n'.join(names).encode('utf-8'))
+
+    os.replace(tmp_file, store_file)
+    print(f"Record store written to {store_file}")
+
+
+class RecordStore:
+    """
+    Memory mapped view of a record store written by write_store
+    """
+
+    def __init__(self, store_file=STORE_FILE):
+        with open(store_file, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_names, n_records, n_fights, n_wins = \
+            HEADER.unpack_from(self.buffer)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{store_file} is not a version {VERSION} "
+                             f"record store")
+
+        view = memoryview(self.buffer)
+        pos = HEADER.size
+
+        def take(count, fmt='I'):
+            nonlocal pos
+            size = count * struct.calcsize(fmt)
+            section = view[pos:pos + size]
+            pos += size + (-size % 4)
+
+            if fmt == 'I' and sys.byteorder == 'big':
+                swapped = array('I')
+                swapped.frombytes(section)
+                swapped.byteswap()
+                return swapped
+            return section.cast(fmt)
+
+        self.fight_offsets = take(n_records + 1)
+        self.fight_opponents = take(n_fights)
+        self.win_offsets = take(n_names + 1)
+        self.win_targets = take(n_wins)
+        self.loss_offsets = take(n_names + 1)
+        self.loss_targets = take(n_wins)
+        self.loss_count = take(n_names)
+        self.espn_ids = take(n_records)
+        self.fight_results = take(n_fights, 'B')
+        self.names = str(view[pos:], 'utf-8').split('\n')
+        self.n_records = n_records
+
+    def record(self, f_id):
+        """
+        :param int f_id: Fighter id
+        :return list: (opponent, result) pairs, None if no record stored
+        """
+        if f_id >= self.n_records:
+            return None
+
+        return [(self.names[self.fight_opponents[i]],
+                 chr(self.fight_results[i]))
+                for i in range(self.fight_offsets[f_id],
+                               self.fight_offsets[f_id + 1])]
+
+    def win_graph(self):
+        return WinGraph(self.names, self.win_offsets, self.win_targets,
+                        self.loss_count, self.loss_offsets, self.loss_targets,
+                        self.espn_ids)
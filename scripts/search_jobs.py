@@ -0,0 +1,163 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+# Seconds a search may run before it is stopped
+SEARCH_BUDGET = 120
+SEARCH_WORKERS = 4
+
+# Seconds a finished job is kept for pollers to read its result
+KEEP_FINISHED = 300
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class SearchTimeout(SearchCancelled):
+    pass
+
+
+class SearchJob:
+    """
+    Handle for one background search. Searches call check() as they go
+    and stop as soon as the job is cancelled or out of time, and hand
+    their latest search_event to report(). riders counts the job ids
+    sharing this search, finished is when it stopped running
+    """
+
+    def __init__(self, job_id, budget):
+        self.job_id = job_id
+        self.deadline = time.monotonic() + budget
+        self.cancelled = threading.Event()
+        self.future = None
+        self.progress = None
+        self.riders = 1
+        self.finished = None
+
+    def report(self, event):
+        self.progress = event
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise SearchCancelled(self.job_id)
+        if time.monotonic() > self.deadline:
+            raise SearchTimeout(self.job_id)
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def status(self):
+        if self.future.cancelled() or self.cancelled.is_set():
+            return 'cancelled'
+        if not self.future.done():
+            return 'running'
+        if isinstance(self.future.exception(), SearchTimeout):
+            return 'timeout'
+        if self.future.exception() is not None:
+            return 'failed'
+        return 'done'
+
+
+class JobManager:
+    """
+    Runs searches on a bounded thread pool so callbacks can return
+    right away and poll for the result. Identical submissions made
+    while a search is running share it, it is only cancelled once
+    every job id riding on it is cancelled. Finished jobs stay readable
+    until they are cancelled or keep seconds have passed, so a poll
+    whose response gets dropped can simply be repeated. Jobs only live
+    in this process, job ids are random so a poll reaching another
+    worker process, or one restarted since, finds its job missing
+    instead of someone else's
+    """
+
+    def __init__(self, workers=SEARCH_WORKERS, budget=SEARCH_BUDGET,
+                 keep=KEEP_FINISHED):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.budget = budget
+        self.keep = keep
+        self.jobs = {}
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def submit(self, search, *args, **kwargs):
+        """
+        :param search: Function accepting check and progress keywords
+        :return str: Job id
+        """
+        key = (search, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            key = None
+
+        with self.lock:
+            self.expire()
+            job_id = uuid4().hex
+            job = self.flights.get(key)
+
+            if job is not None:
+                job.riders += 1
+                self.jobs[job_id] = job
+                return job_id
+
+            job = SearchJob(job_id, self.budget)
+            self.jobs[job_id] = job
+            job.future = self.pool.submit(search, *args, check=job.check,
+                                          progress=job.report, **kwargs)
+            if key is not None:
+                self.flights[key] = job
+
+        job.future.add_done_callback(lambda future: self.land(key, job))
+        return job_id
+
+    def land(self, key, job):
+        with self.lock:
+            job.finished = time.monotonic()
+            if key is not None and self.flights.get(key) is job:
+                del self.flights[key]
+
+    def expire(self):
+        now = time.monotonic()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished is not None and now - job.finished > self.keep:
+                del self.jobs[job_id]
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        return 'missing' if job is None else job.status()
+
+    def progress(self, job_id):
+        job = self.jobs.get(job_id)
+        return None if job is None else job.progress
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return
+
+            job.riders -= 1
+            if job.riders > 0:
+                return
+
+            for key, flight in list(self.flights.items()):
+                if flight is job:
+                    del self.flights[key]
+
+        job.cancel()
+
+    def result(self, job_id):
+        """
+        Result of a finished job, left in place until it expires or is
+        cancelled so polling again returns the same result
+        """
+        return self.jobs[job_id].future.result()
@@ -0,0 +1,51 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key. The first caller runs
+    the function and callers arriving while it runs wait for its result
+    or exception instead of repeating the work. Nothing is kept once
+    the call returns, caching is left to the caller
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.calls)
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        :param key: Hashable key identifying the call
+        :param func: Function to run when no identical call is in flight
+        :return: Result of func, shared by every caller with this key
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
@@ -0,0 +1,87 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import ast
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent / ".."
+
+# Modules app.py should not be paying for before the server binds
+HEAVY_MODULES = ('pandas', 'numpy', 'plotly', 'bs4', 'requests', 'lxml')
+
+
+def import_times(module='app'):
+    """
+    Import module in a fresh interpreter under python -X importtime,
+    with the app's background import warm up turned off
+    :param str module: Module to import
+    :return tuple: Cumulative microseconds of the import, of each
+                   module it imports directly, every module loaded and
+                   the module's startup_times
+    """
+    code = f"import {module}; print(repr(getattr({module}, " \
+           f"'startup_times', {{}})))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'MMA_WARM_IMPORTS': '0'})
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    children = []
+    direct = []
+    loaded = set()
+
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        loaded.add(name)
+
+        # Imports are listed after everything they import in turn
+        if depth == 1:
+            children.append((name, int(cumulative_us)))
+        elif depth == 0:
+            if name == module:
+                total_us = int(cumulative_us)
+                direct = children
+            children = []
+
+    phases = ast.literal_eval(result.stdout.strip().splitlines()[-1])
+    return total_us, direct, loaded, phases
+
+
+def report(module='app', top=10):
+    """
+    Print where a cold import of module spends its time
+    :param str module: Module to import
+    :param int top: Slowest direct imports to list
+    """
+    total_us, direct, loaded, phases = import_times(module)
+
+    print(f"import {module}: {total_us / 1000:.0f} ms")
+    for name, cumulative_us in sorted(direct, key=lambda item: -item[1])[:top]:
+        print(f"    {name:<32}{cumulative_us / 1000:>8.1f} ms")
+
+    for label, seconds in phases.items():
+        print(f"{label:<36}{seconds * 1000:>8.1f} ms")
+
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    print(f"Heavy modules loaded at import: {', '.join(heavy) or 'none'}")
+
+
+def main():
+    report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_FILE = Path(__file__).parent / "../data/cache/stats.sqlite"
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class StatCache:
+    """
+    On disk cache of parsed fighter data keyed by ESPN fighter id.
+    Entries younger than ttl are served as is, entries younger than
+    ttl + stale_ttl are served while a refresh runs in the background,
+    anything older is fetched again. Past max_entries the least recently
+    used fighters are dropped
+    """
+
+    def __init__(self, cache_file=CACHE_FILE, ttl=DAY, stale_ttl=7 * DAY,
+                 max_entries=5000, decode=None):
+        self.cache_file = Path(cache_file)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.decode = decode
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.conn = None
+
+    def connect(self):
+        if self.conn is None:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(self.cache_file),
+                                        check_same_thread=False)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS stats ('
+                              'id INTEGER PRIMARY KEY, data TEXT NOT NULL, '
+                              'fetched REAL NOT NULL, used REAL NOT NULL)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS stats_used '
+                              'ON stats (used)')
+        return self.conn
+
+    def get(self, key):
+        """
+        :param int key: Fighter id
+        :return tuple: Cached value and time it was fetched, (None, None)
+                       if the fighter is not cached
+        """
+        with self.lock:
+            conn = self.connect()
+            row = conn.execute('SELECT data, fetched FROM stats WHERE id = ?',
+                               (key,)).fetchone()
+            if row is None:
+                return None, None
+
+            conn.execute('UPDATE stats SET used = ? WHERE id = ?',
+                         (time.time(), key))
+            conn.commit()
+
+        value = json.loads(row[0])
+        if self.decode is not None:
+            value = self.decode(value)
+        return value, row[1]
+
+    def put(self, key, value):
+        now = time.time()
+
+        with self.lock:
+            conn = self.connect()
+            conn.execute('INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?)',
+                         (key, json.dumps(value), now, now))
+            conn.execute('DELETE FROM stats WHERE id IN ('
+                         'SELECT id FROM stats ORDER BY used DESC '
+                         'LIMIT -1 OFFSET ?)', (self.max_entries,))
+            conn.commit()
+
+    def fetch(self, key, loader, executor=None):
+        """
+        Return the cached value for key, loading it when missing or expired
+        :param int key: Fighter id
+        :param loader: Zero argument function producing the value
+        :param Executor executor: Pool used for stale-while-revalidate,
+                                  stale entries are reloaded inline without one
+        :return: Cached or freshly loaded value
+        """
+        value, fetched = self.get(key)
+
+        if value is not None:
+            age = time.time() - fetched
+
+            if age < self.ttl:
+                return value
+
+            if age < self.ttl + self.stale_ttl and executor is not None:
+                self.revalidate(key, loader, executor)
+                return value
+
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def revalidate(self, key, loader, executor):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self.put(key, loader())
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        executor.submit(refresh)
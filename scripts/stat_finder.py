@@ -3,16 +3,31 @@ Author: Aaron Ho
 Python Version: 3.7
 """
 
+import io
 import warnings
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 
+from scripts.name_index import NameIndex, link_to_id
+from scripts.singleflight import SingleFlight
+from scripts.stat_cache import StatCache
+
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
+# Seconds allowed per request, and for a whole batch of fighters
+FETCH_TIMEOUT = 10
+FETCH_WORKERS = 8
+
+fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+
 
 def name_to_url(db, name):
+    if isinstance(db, NameIndex):
+        return db.url(name)
+
     link = list(db.loc[db['name'] == name]['link'])
 
     if len(link) > 0:
@@ -54,184 +69,300 @@ def percent_to_stats(df, col):
         return 0.0
 
 
-def scrape_ratio(link):
-    try:
-        split_url = link.split('_')
-        stat_link = f"{split_url[0]}stats/_{split_url[1]}"
+def stats_link(link):
+    split_url = link.split('_')
+    return f"{split_url[0]}stats/_{split_url[1]}"
 
-        response = requests.get(stat_link, timeout=10)
-        src = response.content
 
-        soup = BeautifulSoup(src, 'lxml')
-        record_list = soup.find_all('div', class_='StatBlockInner__Value')
+def empty_ratio():
+    return {'WLD': (0, 0, 0), 'KO': (0, 0), 'SUB': (0, 0)}
 
-        if len(record_list) == 3:
-            win_loss = tuple(map(int, record_list[0].text.split('-')))
-            ko = tuple(map(int, record_list[1].text.split('-')))
-            sub = tuple(map(int, record_list[2].text.split('-')))
 
-            return {'WLD': win_loss, 'KO': ko, 'SUB': sub}
-        else:
-            return {'WLD': (0, 0, 0), 'KO': (0, 0), 'SUB': (0, 0)}
+def empty_stats():
+    striking_stats = {'Head Strike Accuracy': 0.0,
+                      'Body Strike Accuracy': 0.0,
+                      'Leg Strike Accuracy': 0.0,
+                      'Significant Strike Accuracy': 0.0,
+                      'Total Strike Accuracy': 0.0,
+                      'Breakdown Head': 0.0,
+                      'Breakdown Body': 0.0,
+                      'Breakdown Leg': 0.0
+                      }
 
-    except (ImportError, TypeError, AttributeError):
-        return {'WLD': (0, 0, 0), 'KO': (0, 0), 'SUB': (0, 0)}
+    clinch_stats = {'Takedown Accuracy': 0.0}
 
+    ground_stats = {'Ground Head Strike Accuracy': 0.0,
+                    'Ground Body Strike Accuracy': 0.0,
+                    'Ground Leg Strike Accuracy': 0.0,
+                    }
+    return striking_stats, clinch_stats, ground_stats
 
-def scrape_stats(link):
-    try:
-        split_url = link.split('_')
-        stat_link = f"{split_url[0]}stats/_{split_url[1]}"
-
-        df_list = pd.read_html(stat_link)
-
-        # Get striking stats
-        striking = df_list[0]
-
-        body_s = list(striking.loc[(striking['SDBL/A'] != '-') &
-                                   (striking['SDBL/A'] != '0/0')]['SDBL/A'])
-
-        head_s = list(striking.loc[(striking['SDHL/A'] != '-') &
-                                   (striking['SDHL/A'] != '0/0')]['SDHL/A'])
-
-        leg_s = list(striking.loc[(striking['SDLL/A'] != '-') &
-                                  (striking['SDLL/A'] != '0/0')]['SDLL/A'])
-
-        t_sigs = striking.loc[(striking['SSL'] != '-') &
-                              (striking['SSA'] != '-') &
-                              (striking['SSA'].astype(str) != '0')][['SSL', 'SSA']]
-
-        if t_sigs.empty:
-            sig_r = 0.0
-        else:
-            sig_r = round((sum(t_sigs['SSL'].astype(float)) /
-                           sum(t_sigs['SSA'].astype(float))), 2) * 100
-
-        total_s = striking.loc[striking['TSL-TSA'] != '-'][['TSL-TSA']]
-
-        targets = striking.loc[((striking['%BODY'] != '0%') |
-                                (striking['%HEAD'] != '0%') |
-                                (striking['%LEG'] != '0%')) &
-                               (striking['%BODY'] != '-') &
-                               (striking['%HEAD'] != '-') &
-                               (striking['%LEG'] != '-')][['%BODY',
-                                                           '%HEAD', '%LEG']]
-
-        clinch = df_list[1]
-
-        takedowns = clinch.loc[((clinch['TDL'].astype(str) != '0') |
-                                (clinch['TDA'].astype(str) != '0')) &
-                               (clinch['TDL'] != '-') &
-                               (clinch['TDA'] != '-')]
-
-        if takedowns.empty:
-            td_a = 0.0
-        else:
-            td_a = round((sum(takedowns['TDL'].astype(float)) /
-                          sum(takedowns['TDA'].astype(float))), 2) * 100
-
-        # Get ground stats
-        ground = df_list[2]
-
-        body_gs = ground.loc[(ground['SGBA'].astype(str) != '0') &
-                             (ground['SGBA'] != '-') &
-                             (ground['SGBL'] != '-')][['SGBL', 'SGBA']]
-
-        if body_gs.empty:
-            bgs_a = 0.0
-        else:
-            bgs_a = round((sum(body_gs['SGBL'].astype(float)) /
-                           sum(body_gs['SGBA'].astype(float))), 2) * 100
-
-        head_gs = ground.loc[(ground['SGHA'].astype(str) != '0') &
-                             (ground['SGHA'] != '-') &
-                             (ground['SGHL'] != '-')][['SGHL', 'SGHA']]
-
-        if head_gs.empty:
-            hgs_a = 0.0
-        else:
-            hgs_a = round((sum(head_gs['SGHL'].astype(float)) /
-                           sum(head_gs['SGHA'].astype(float))), 2) * 100
-
-        leg_gs = ground.loc[(ground['SGLA'].astype(str) != '0') &
-                            (ground['SGLA'] != '-') &
-                            (ground['SGLL'] != '-')][['SGLL', 'SGLA']]
-
-        if leg_gs.empty:
-            lgs_a = 0.0
-        else:
-            lgs_a = round((sum(leg_gs['SGLL'].astype(float)) /
-                           sum(leg_gs['SGLA'].astype(float))), 2) * 100
-
-        # Process stats into dict
-        striking_stats = {'Head Strike Accuracy': frac_to_stats(head_s),
-                          'Body Strike Accuracy': frac_to_stats(body_s),
-                          'Leg Strike Accuracy': frac_to_stats(leg_s),
-                          'Significant Strike Accuracy': sig_r,
-                          'Total Strike Accuracy':
-                              percent_to_stats(total_s, 'TSL-TSA'),
-                          'Breakdown Head': percent_to_stats(targets, '%HEAD'),
-                          'Breakdown Body': percent_to_stats(targets, '%BODY'),
-                          'Breakdown Leg': percent_to_stats(targets, '%LEG')
-                          }
-
-        clinch_stats = {'Takedown Accuracy': td_a}
-
-        ground_stats = {'Ground Head Strike Accuracy': hgs_a,
-                        'Ground Body Strike Accuracy': bgs_a,
-                        'Ground Leg Strike Accuracy': lgs_a,
-                        }
-
-        return striking_stats, clinch_stats, ground_stats
 
-    except (ImportError, TypeError, AttributeError):
-        striking_stats = {'Head Strike Accuracy': 0.0,
-                          'Body Strike Accuracy': 0.0,
-                          'Leg Strike Accuracy': 0.0,
-                          'Significant Strike Accuracy': 0.0,
-                          'Total Strike Accuracy': 0.0,
-                          'Breakdown Head': 0.0,
-                          'Breakdown Body': 0.0,
-                          'Breakdown Leg': 0.0
-                          }
+def parse_ratio(soup):
+    """
+    Parse W-L-D, KO and SUB blocks from a parsed stats page
+    :param BeautifulSoup soup:
+    :return dict:
+    """
+    record_list = soup.find_all('div', class_='StatBlockInner__Value')
 
-        clinch_stats = {'Takedown Accuracy': 0.0}
+    if len(record_list) == 3:
+        win_loss = tuple(map(int, record_list[0].text.split('-')))
+        ko = tuple(map(int, record_list[1].text.split('-')))
+        sub = tuple(map(int, record_list[2].text.split('-')))
 
-        ground_stats = {'Ground Head Strike Accuracy': 0.0,
-                        'Ground Body Strike Accuracy': 0.0,
-                        'Ground Leg Strike Accuracy': 0.0,
-                        }
-        return striking_stats, clinch_stats, ground_stats
+        return {'WLD': win_loss, 'KO': ko, 'SUB': sub}
+    else:
+        return empty_ratio()
 
 
-def get_header_img(link):
+def parse_stats(df_list):
+    """
+    Parse striking, clinch and ground tables from a stats page
+    :param list df_list: DataFrames returned by read_html
+    :return tuple:
+    """
+    # Get striking stats
+    striking = df_list[0]
+
+    body_s = list(striking.loc[(striking['SDBL/A'] != '-') &
+                               (striking['SDBL/A'] != '0/0')]['SDBL/A'])
+
+    head_s = list(striking.loc[(striking['SDHL/A'] != '-') &
+                               (striking['SDHL/A'] != '0/0')]['SDHL/A'])
+
+    leg_s = list(striking.loc[(striking['SDLL/A'] != '-') &
+                              (striking['SDLL/A'] != '0/0')]['SDLL/A'])
+
+    t_sigs = striking.loc[(striking['SSL'] != '-') &
+                          (striking['SSA'] != '-') &
+                          (striking['SSA'].astype(str) != '0')][['SSL', 'SSA']]
+
+    if t_sigs.empty:
+        sig_r = 0.0
+    else:
+        sig_r = round((sum(t_sigs['SSL'].astype(float)) /
+                       sum(t_sigs['SSA'].astype(float))), 2) * 100
+
+    total_s = striking.loc[striking['TSL-TSA'] != '-'][['TSL-TSA']]
+
+    targets = striking.loc[((striking['%BODY'] != '0%') |
+                            (striking['%HEAD'] != '0%') |
+                            (striking['%LEG'] != '0%')) &
+                           (striking['%BODY'] != '-') &
+                           (striking['%HEAD'] != '-') &
+                           (striking['%LEG'] != '-')][['%BODY',
+                                                       '%HEAD', '%LEG']]
+
+    clinch = df_list[1]
+
+    takedowns = clinch.loc[((clinch['TDL'].astype(str) != '0') |
+                            (clinch['TDA'].astype(str) != '0')) &
+                           (clinch['TDL'] != '-') &
+                           (clinch['TDA'] != '-')]
+
+    if takedowns.empty:
+        td_a = 0.0
+    else:
+        td_a = round((sum(takedowns['TDL'].astype(float)) /
+                      sum(takedowns['TDA'].astype(float))), 2) * 100
+
+    # Get ground stats
+    ground = df_list[2]
+
+    body_gs = ground.loc[(ground['SGBA'].astype(str) != '0') &
+                         (ground['SGBA'] != '-') &
+                         (ground['SGBL'] != '-')][['SGBL', 'SGBA']]
+
+    if body_gs.empty:
+        bgs_a = 0.0
+    else:
+        bgs_a = round((sum(body_gs['SGBL'].astype(float)) /
+                       sum(body_gs['SGBA'].astype(float))), 2) * 100
+
+    head_gs = ground.loc[(ground['SGHA'].astype(str) != '0') &
+                         (ground['SGHA'] != '-') &
+                         (ground['SGHL'] != '-')][['SGHL', 'SGHA']]
+
+    if head_gs.empty:
+        hgs_a = 0.0
+    else:
+        hgs_a = round((sum(head_gs['SGHL'].astype(float)) /
+                       sum(head_gs['SGHA'].astype(float))), 2) * 100
+
+    leg_gs = ground.loc[(ground['SGLA'].astype(str) != '0') &
+                        (ground['SGLA'] != '-') &
+                        (ground['SGLL'] != '-')][['SGLL', 'SGLA']]
+
+    if leg_gs.empty:
+        lgs_a = 0.0
+    else:
+        lgs_a = round((sum(leg_gs['SGLL'].astype(float)) /
+                       sum(leg_gs['SGLA'].astype(float))), 2) * 100
+
+    # Process stats into dict
+    striking_stats = {'Head Strike Accuracy': frac_to_stats(head_s),
+                      'Body Strike Accuracy': frac_to_stats(body_s),
+                      'Leg Strike Accuracy': frac_to_stats(leg_s),
+                      'Significant Strike Accuracy': sig_r,
+                      'Total Strike Accuracy':
+                          percent_to_stats(total_s, 'TSL-TSA'),
+                      'Breakdown Head': percent_to_stats(targets, '%HEAD'),
+                      'Breakdown Body': percent_to_stats(targets, '%BODY'),
+                      'Breakdown Leg': percent_to_stats(targets, '%LEG')
+                      }
+
+    clinch_stats = {'Takedown Accuracy': td_a}
+
+    ground_stats = {'Ground Head Strike Accuracy': hgs_a,
+                    'Ground Body Strike Accuracy': bgs_a,
+                    'Ground Leg Strike Accuracy': lgs_a,
+                    }
+
+    return striking_stats, clinch_stats, ground_stats
+
+
+def parse_header(soup, link):
+    """
+    Parse headshot and name from any page carrying the player header
+    :param BeautifulSoup soup:
+    :param str link: Fighter url, used for the headshot id
+    :return tuple:
+    """
     img_link = None
     f_name = None
     l_name = None
 
+    headshot = soup.find_all('figure', class_='PlayerHeader__HeadShot')
+    name_header = soup.find_all('h1', class_='PlayerHeader__Name')
+
+    if len(headshot) > 0:
+        id_num = link_to_id(link)
+        img_link = (f"https://a.espncdn.com/combiner/i?img=/i/headshots/"
+                    f"mma/players/full/{id_num}.png&w=350&h=254")
+
+    if len(name_header) > 0:
+        name_list = name_header[0].find_all('span')
+        f_name = name_list[0].text
+        l_name = name_list[1].text
+
+    return img_link, f_name, l_name
+
+
+def scrape_ratio(link):
+    try:
+        response = requests.get(stats_link(link), timeout=FETCH_TIMEOUT)
+        return parse_ratio(BeautifulSoup(response.content, 'lxml'))
+
+    except (ImportError, TypeError, AttributeError):
+        return empty_ratio()
+
+
+def scrape_stats(link):
+    try:
+        return parse_stats(pd.read_html(stats_link(link)))
+
+    except (ImportError, TypeError, AttributeError):
+        return empty_stats()
+
+
+def get_header_img(link):
     if link is None:
-        return img_link, f_name, l_name
+        return None, None, None
 
     else:
-        response = requests.get(link, timeout=10)
-        src = response.content
-        soup = BeautifulSoup(src, 'html.parser')
+        response = requests.get(link, timeout=FETCH_TIMEOUT)
+        return parse_header(BeautifulSoup(response.content, 'html.parser'),
+                            link)
 
-        headshot = soup.find_all('figure', class_='PlayerHeader__HeadShot')
-        name_header = soup.find_all('h1', class_='PlayerHeader__Name')
 
-        if len(headshot) > 0:
-            split_id = link.split('id/')[-1]
-            id_num = split_id.split('/')[0]
-            img_link = (f"https://a.espncdn.com/combiner/i?img=/i/headshots/"
-                        f"mma/players/full/{id_num}.png&w=350&h=254")
+def scrape_fighter(link):
+    """
+    Fetch the stats page once and parse header, record ratios and
+    stat tables out of the same response
+    :param str link: Fighter url
+    :return tuple: header, records, stats
+    """
+    if link is None:
+        return (None, None, None), empty_ratio(), empty_stats()
 
-        if len(name_header) > 0:
-            name_list = name_header[0].find_all('span')
-            f_name = name_list[0].text
-            l_name = name_list[1].text
+    response = requests.get(stats_link(link), timeout=FETCH_TIMEOUT)
+    soup = BeautifulSoup(response.content, 'lxml')
+    header = parse_header(soup, link)
 
-    return img_link, f_name, l_name
+    try:
+        records = parse_ratio(soup)
+    except (TypeError, AttributeError, ValueError):
+        records = empty_ratio()
+
+    try:
+        stats = parse_stats(pd.read_html(io.StringIO(response.text)))
+    except (ImportError, TypeError, AttributeError):
+        stats = empty_stats()
+
+    return header, records, stats
+
+
+def restore_fighter(data):
+    """
+    Turn a json decoded scrape_fighter result back into tuples
+    :param list data: header, records, stats
+    :return tuple:
+    """
+    header, records, stats = data
+    records = {key: tuple(val) for key, val in records.items()}
+    return tuple(header), records, tuple(stats)
+
+
+stat_cache = StatCache(decode=restore_fighter)
+fetch_flight = SingleFlight()
+
+
+def cached_scrape_fighter(link):
+    """
+    scrape_fighter backed by the on disk stat cache. Concurrent requests
+    for the same fighter share a single cache read and fetch. A fighter
+    whose page can't be fetched or parsed gets empty data, which is not
+    cached so the next request tries again
+    :param str link: Fighter url
+    :return tuple: header, records, stats
+    """
+    f_id = link_to_id(link)
+
+    try:
+        if f_id is None:
+            return scrape_fighter(link)
+
+        return fetch_flight.do(f_id, stat_cache.fetch, f_id,
+                               lambda: scrape_fighter(link), fetch_pool)
+
+    except Exception as err:
+        print(f"Problem scraping {link}: {err!r}")
+        return scrape_fighter(None)
+
+
+def scrape_fighters(links, timeout=FETCH_TIMEOUT * 2):
+    """
+    Scrape several fighters concurrently so a batch costs about as much
+    as its slowest fighter. Fighters that fail or run past the timeout
+    fall back to empty data
+    :param list links: Fighter urls
+    :param float timeout: Seconds to wait for the whole batch
+    :return list: (header, records, stats) per link, in order
+    """
+    futures = [fetch_pool.submit(cached_scrape_fighter, link)
+               for link in links]
+    wait(futures, timeout=timeout)
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result(timeout=0))
+        except Exception:
+            future.cancel()
+            results.append(scrape_fighter(None))
+
+    return results
 
 
 def main():
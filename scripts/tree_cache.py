@@ -0,0 +1,114 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import threading
+from collections import OrderedDict
+
+from scripts.landmarks import bfs_levels
+
+# A tree over the full graph is two int32 arrays, about 200 KB
+TREE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def tree_bytes(tree):
+    return sum(column.itemsize * len(column) for column in tree)
+
+
+def tree_path(parent, a_id, b_id):
+    """
+    :param array parent: BFS tree from bfs_levels
+    :return list: Node ids from Fighter A to Fighter B, None if no path
+    """
+    if b_id is None or parent[b_id] < 0 or a_id == b_id:
+        return None
+
+    path = [b_id]
+    while path[-1] != a_id:
+        path.append(parent[path[-1]])
+
+    path.reverse()
+    return path
+
+
+class TreeCache:
+    """
+    LRU of full BFS trees keyed by (graph version, challenger), bounded
+    by the bytes the trees hold. Trees from an older graph version are
+    dropped as soon as one from a newer version is added
+    """
+
+    def __init__(self, max_bytes=TREE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.trees = OrderedDict()
+        self.size = 0
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.trees)
+
+    def get(self, version, a_id):
+        with self.lock:
+            tree = self.trees.get((version, a_id))
+            if tree is not None:
+                self.trees.move_to_end((version, a_id))
+            return tree
+
+    def put(self, version, a_id, tree):
+        with self.lock:
+            if version < self.version or (version, a_id) in self.trees:
+                return
+
+            if version > self.version:
+                self.trees.clear()
+                self.size = 0
+                self.version = version
+
+            self.trees[(version, a_id)] = tree
+            self.size += tree_bytes(tree)
+
+            while self.size > self.max_bytes and len(self.trees) > 1:
+                self.size -= tree_bytes(self.trees.popitem(last=False)[1])
+
+
+def tree_levels(graph, a_id, check=None):
+    """
+    Full BFS tree from Fighter A, from graph.trees when cached there
+    :param WinGraph graph: Preloaded win graph
+    :param int a_id: Id of fighter A
+    :param check: Called once per level searched, raises to stop
+    :return: Generator yielding (depth, frontier, visited) per level
+             searched, returns dist and parent arrays and whether a
+             search ran
+    """
+    cache = graph.trees
+    version = graph.version
+
+    if cache is not None:
+        tree = cache.get(version, a_id)
+        if tree is not None:
+            return tree[0], tree[1], False
+
+    offsets, targets = graph.csr[:2]
+    tree = yield from bfs_levels(offsets, targets, a_id, check)
+
+    if cache is not None:
+        cache.put(version, a_id, tree)
+
+    return tree[0], tree[1], True
+
+
+def tree_from(graph, a_id, check=None):
+    """
+    tree_levels run to the end
+    :return tuple: dist and parent arrays and whether a search ran
+    """
+    levels = tree_levels(graph, a_id, check)
+
+    while True:
+        try:
+            next(levels)
+        except StopIteration as done:
+            return done.value
@@ -3,352 +3,261 @@ Author: Aaron Ho
 Python Version: 3.7
 """
 
-import pandas as pd
-import plotly.express as px
+import threading
+from collections import OrderedDict
+
+import plotly.graph_objects as go
+
+# Finished figures kept by the values they plot
+FIGURE_CACHE_SIZE = 1024
+
+MARGIN = {'pad': 0, 'l': 0, 'r': 0, 'b': 0, 't': 0}
+TRANSITION = {'duration': 300, 'easing': 'linear'}
+
+TARGETS = ['Head', 'Body', 'Leg']
+TARGET_TRACES = [('Ground Strikes', 'Ground', '#BB86FC'),
+                 ('Standing Strikes', 'Standing', '#F9AA33'),
+                 ('Overall Accuracy', 'Overall', '#4ACFAC')]
+TARGET_HOVER = ('<b>%{y}</b><br><br>'
+                'Fight Position: %{data.offsetgroup}<br><br>'
+                'Striking Accuracy: %{x}<extra></extra>')
+
+TOTALS = ['Total Strike Accuracy',
+          'Significant Strike Accuracy',
+          'Takedown Accuracy']
+
+METHODS = ['Decisions', "(T)KO's", 'Submissions']
+METHOD_COLORS = ['#4ACFAC', '#F9AA33', '#BB86FC']
 
 """
-Plot Target graphs
+Figure Templates
+
+Each template is built once with graph_objects and kept as a plain
+figure dict, a figure is the template with its numbers swapped in
 """
 
 
-def plot_targets(stats):
-    striking = stats[0]
-    ground = stats[2]
-    target_data = {'Striking Accuracy': ['Head', 'Head', 'Head',
-                                         'Body', 'Body', 'Body',
-                                         'Leg', 'Leg', 'Leg'],
-                   'Type': ['Overall', 'Standing', 'Ground',
-                            'Overall', 'Standing', 'Ground',
-                            'Overall', 'Standing', 'Ground'],
-                   'Percent': [striking['Breakdown Head'],
-                               striking['Head Strike Accuracy'],
-                               ground['Ground Head Strike Accuracy'],
-                               striking['Breakdown Body'],
-                               striking['Body Strike Accuracy'],
-                               ground['Ground Body Strike Accuracy'],
-                               striking['Breakdown Leg'],
-                               striking['Leg Strike Accuracy'],
-                               ground['Ground Leg Strike Accuracy']]
-                   }
-
-    df = pd.DataFrame(target_data, columns=['Striking Accuracy', 'Type', 'Percent'])
-    fig = px.bar(data_frame=df,
-                 y='Striking Accuracy',
-                 x='Percent',
-                 range_x=[0, 110],
-                 color='Type',
-                 barmode='group',
-                 category_orders={'Striking Accuracy': ['Head', 'Body', 'Leg'],
-                                  'Type': ['Ground', 'Standing', 'Overall']},
-                 orientation='h',
-                 labels={'Type': 'Striking Position'},
-                 text='Percent',
-                 template='plotly_dark',
-                 color_discrete_map={'Overall': '#4ACFAC', 'Standing': '#F9AA33', 'Ground': '#BB86FC'}
-                 )
-
-    fig.update_traces(
-        legendgroup="position",
-        textposition="outside",
-        texttemplate='%{x}',
-        hovertemplate=('<b>%{y}</b><br><br>'
-                       'Fight Position: %{data.offsetgroup}<br><br>'
-                       'Striking Accuracy: %{x}<extra></extra>')
-    )
+def targets_template(reverse):
+    fig = go.Figure()
+
+    for name, position, color in TARGET_TRACES:
+        fig.add_trace(go.Bar(name=name,
+                             y=TARGETS,
+                             orientation='h',
+                             offsetgroup=position,
+                             alignmentgroup='True',
+                             legendgroup='position',
+                             marker={'color': color},
+                             textposition='outside',
+                             texttemplate='%{x}',
+                             hovertemplate=TARGET_HOVER))
 
-    fig['data'][0]['name'] = 'Ground Strikes'
-    fig['data'][1]['name'] = 'Standing Strikes'
-    fig['data'][2]['name'] = 'Overall Accuracy'
     fig.update_layout(
+        template='plotly_dark',
+        barmode='group',
         autosize=True,
-        margin={
-            'pad': 0,
-            'l': 0,
-            'r': 0,
-            'b': 0,
-            't': 0,
-        },
-
+        margin=MARGIN,
         legend={
             'title': '',
+            'tracegroupgap': 0,
             'itemsizing': 'trace',
-            'traceorder': 'reversed',
+            'traceorder': 'normal' if reverse else 'reversed',
             'orientation': 'h',
-            'x': 0.4, 'y': 1,
+            'x': 0.6 if reverse else 0.4, 'y': 1,
             'xanchor': 'center',
             'yanchor': 'bottom',
         },
-        transition={
-            'duration': 300,
-            'easing': 'linear'
-        }
-
+        transition=TRANSITION
     )
 
     fig.update_yaxes(
         showgrid=False,
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        ticksuffix=" Strikes",
+        title={'text': '', 'standoff': 0},
+        categoryorder='array',
+        categoryarray=TARGETS[::-1],
         visible=False
     )
 
+    if reverse:
+        fig.update_yaxes(side='right')
+    else:
+        fig.update_yaxes(ticksuffix=' Strikes')
+
     fig.update_xaxes(
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        ticksuffix="%",
+        title={'text': '', 'standoff': 0},
+        range=[110, 0] if reverse else [0, 110],
+        ticksuffix='%'
     )
 
     return fig
 
 
-def plot_targets_reverse(stats):
-    striking = stats[0]
-    ground = stats[2]
-    target_data = {'Striking Accuracy': ['Head', 'Head', 'Head',
-                                         'Body', 'Body', 'Body',
-                                         'Leg', 'Leg', 'Leg'],
-                   'Type': ['Overall', 'Standing', 'Ground',
-                            'Overall', 'Standing', 'Ground',
-                            'Overall', 'Standing', 'Ground'],
-                   'Percent': [striking['Breakdown Head'],
-                               striking['Head Strike Accuracy'],
-                               ground['Ground Head Strike Accuracy'],
-                               striking['Breakdown Body'],
-                               striking['Body Strike Accuracy'],
-                               ground['Ground Body Strike Accuracy'],
-                               striking['Breakdown Leg'],
-                               striking['Leg Strike Accuracy'],
-                               ground['Ground Leg Strike Accuracy']]
-                   }
-
-    df = pd.DataFrame(target_data, columns=['Striking Accuracy', 'Type', 'Percent'])
-    fig = px.bar(data_frame=df,
-                 y='Striking Accuracy',
-                 x='Percent',
-                 range_x=[110, 0],
-                 color='Type',
-                 barmode='group',
-                 category_orders={'Striking Accuracy': ['Head', 'Body', 'Leg'],
-                                  'Type': ['Ground', 'Standing', 'Overall']},
-                 orientation='h',
-                 labels={'Type': 'Striking Position'},
-                 text='Percent',
-                 template='plotly_dark',
-                 color_discrete_map={'Overall': '#4ACFAC', 'Standing': '#F9AA33', 'Ground': '#BB86FC'}
-                 )
-
-    fig.update_traces(
-        legendgroup="position",
-        textposition="outside",
-
-        texttemplate='%{x}',
-        hovertemplate=('<b>%{y}</b><br><br>'
-                       'Fight Position: %{data.offsetgroup}<br><br>'
-                       'Striking Accuracy: %{x}<extra></extra>')
-    )
-
-    fig['data'][0]['name'] = 'Ground Strikes'
-    fig['data'][1]['name'] = 'Standing Strikes'
-    fig['data'][2]['name'] = 'Overall Accuracy'
-
-    fig.update_layout(
-        autosize=True,
-        margin={
-            'pad': 0,
-            'l': 0,
-            'r': 0,
-            'b': 0,
-            't': 0,
-        },
+def totals_template(reverse):
+    fig = go.Figure(go.Bar(y=TOTALS,
+                           orientation='h',
+                           name='',
+                           offsetgroup='',
+                           alignmentgroup='True',
+                           legendgroup='',
+                           showlegend=False,
+                           marker={'color': '#3498db' if reverse else '#e74c3c'},
+                           textposition='outside',
+                           texttemplate='%{x}',
+                           hovertemplate='<b>%{label}</b><br><br>Percent: %{x}'))
 
-        legend={
-            'title': '',
-            'itemsizing': 'trace',
-            'traceorder': 'normal',
-            'orientation': 'h',
-            'x': 0.6, 'y': 1,
-            'xanchor': 'center',
-            'yanchor': 'bottom',
-        },
-        transition={
-            'duration': 300,
-            'easing': 'linear'
-        }
+    fig.update_layout(showlegend=False,
+                      template='plotly_dark',
+                      barmode='relative',
+                      autosize=True,
+                      legend={'tracegroupgap': 0},
+                      margin=MARGIN,
+                      transition=TRANSITION)
 
-    )
+    if reverse:
+        fig.update_layout(hoverlabel={'font': {'color': '#ffffff'}})
 
     fig.update_yaxes(
         showgrid=False,
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        side="right",
-        visible=False,
+        title={'text': '', 'standoff': 0.5 if reverse else 0},
+        visible=False
     )
 
-    fig.update_xaxes(
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        ticksuffix="%",
+    if reverse:
+        fig.update_yaxes(side='right')
 
+    fig.update_xaxes(
+        title={'text': '', 'standoff': 0},
+        range=[105, 0] if reverse else [0, 105],
+        ticksuffix='%'
     )
 
     return fig
 
 
+def ratios_template():
+    fig = go.Figure(go.Pie(labels=METHODS,
+                           customdata=[[method] for method in METHODS],
+                           name='',
+                           legendgroup='',
+                           showlegend=True,
+                           marker={'colors': METHOD_COLORS},
+                           textposition='inside',
+                           textinfo='label+percent',
+                           textfont={'size': 40},
+                           hovertemplate=('<b>%{label}</b><br> Percent: %{percent}'
+                                          '<br> Count: %{value}')))
+
+    fig.update_layout(showlegend=False,
+                      template='plotly_dark',
+                      autosize=True,
+                      legend={'tracegroupgap': 0},
+                      margin=MARGIN,
+                      transition=TRANSITION)
+
+    return fig
+
+
+# kind: (template builder, trace fields filled with each trace's numbers)
+TEMPLATES = {
+    'targets': (lambda: targets_template(False), ('x', 'text')),
+    'targets_reverse': (lambda: targets_template(True), ('x', 'text')),
+    'totals': (lambda: totals_template(False), ('x', 'text')),
+    'totals_reverse': (lambda: totals_template(True), ('x', 'text')),
+    'ratios': (ratios_template, ('values',))
+}
+
+templates = {}
+figure_cache = OrderedDict()
+cache_lock = threading.Lock()
+
+
+def render(kind, values):
+    """
+    Figure of the given kind, from the cache when the same numbers were
+    plotted before. Cached figures are shared between callers, so they
+    must be copied before being changed
+    :param str kind: Key of TEMPLATES
+    :param tuple values: Tuple of numbers for each trace of the figure
+    :return dict: Plotly figure
+    """
+    key = (kind, values)
+
+    with cache_lock:
+        fig = figure_cache.get(key)
+        if fig is not None:
+            figure_cache.move_to_end(key)
+            return fig
+
+    build, fields = TEMPLATES[kind]
+    template = templates.get(kind)
+    if template is None:
+        template = templates.setdefault(kind, build().to_dict())
+
+    data = []
+    for trace, numbers in zip(template['data'], values):
+        trace = dict(trace)
+        for field in fields:
+            trace[field] = list(numbers)
+        data.append(trace)
+
+    fig = {'data': data, 'layout': template['layout']}
+
+    with cache_lock:
+        figure_cache[key] = fig
+        if len(figure_cache) > FIGURE_CACHE_SIZE:
+            figure_cache.popitem(last=False)
+
+    return fig
+
+
 """
-Plot Stat Total Graphs
+Plot Target graphs
 """
 
 
-def plot_totals(stats):
+def target_values(stats):
     striking = stats[0]
-    clinch = stats[1]
+    ground = stats[2]
 
-    total_data = {'Stats': ['Total Strike Accuracy',
-                            'Significant Strike Accuracy',
-                            'Takedown Accuracy'],
-
-                  'Percent': [striking['Total Strike Accuracy'],
-                              striking['Significant Strike Accuracy'],
-                              clinch['Takedown Accuracy']
-                              ]
-                  }
-    df = pd.DataFrame(total_data, columns=['Stats', 'Percent'])
-
-    fig = px.bar(data_frame=df,
-                 y='Stats',
-                 x='Percent',
-                 range_x=[0, 105],
-                 text='Percent',
-                 orientation='h',
-                 template='plotly_dark',
-                 color_discrete_sequence=['#e74c3c', '#e74c3c', '#e74c3c'],
-                 )
-
-    fig.update_traces(
-        textposition="outside",
-        texttemplate='%{x}',
-        hovertemplate=('<b>%{label}</b><br><br>Percent: %{x}')
-    )
+    return ((ground['Ground Head Strike Accuracy'],
+             ground['Ground Body Strike Accuracy'],
+             ground['Ground Leg Strike Accuracy']),
+            (striking['Head Strike Accuracy'],
+             striking['Body Strike Accuracy'],
+             striking['Leg Strike Accuracy']),
+            (striking['Breakdown Head'],
+             striking['Breakdown Body'],
+             striking['Breakdown Leg']))
 
-    fig.update_layout(showlegend=False,
-                      autosize=True,
 
-                      margin={
-                          'pad': 0,
-                          'l': 0,
-                          'r': 0,
-                          'b': 0,
-                          't': 0,
-                      },
-                      transition={
-                          'duration': 300,
-                          'easing': 'linear'
-                      }
+def plot_targets(stats):
+    return render('targets', target_values(stats))
 
-                      )
 
-    fig.update_yaxes(
-        showgrid=False,
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        visible=False
-    )
+def plot_targets_reverse(stats):
+    return render('targets_reverse', target_values(stats))
 
-    fig.update_xaxes(
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        ticksuffix="%",
-    )
 
-    return fig
+"""
+Plot Stat Total Graphs
+"""
 
 
-def plot_totals_reverse(stats):
+def total_values(stats):
     striking = stats[0]
     clinch = stats[1]
 
-    total_data = {'Stats': ['Total Strike Accuracy',
-                            'Significant Strike Accuracy',
-                            'Takedown Accuracy'],
-
-                  'Percent': [striking['Total Strike Accuracy'],
-                              striking['Significant Strike Accuracy'],
-                              clinch['Takedown Accuracy']
-                              ]
-                  }
-    df = pd.DataFrame(total_data, columns=['Stats', 'Percent'])
-
-    fig = px.bar(data_frame=df,
-                 y='Stats',
-                 x='Percent',
-                 range_x=[105, 0],
-                 text='Percent',
-                 orientation='h',
-                 template='plotly_dark',
-                 color_discrete_sequence=['#3498db', '#3498db', '#3498db']
-                 )
-
-    fig.update_traces(
-        textposition="outside",
-        texttemplate='%{x}',
-        hovertemplate=('<b>%{label}</b><br><br>Percent: %{x}')
-    )
+    return ((striking['Total Strike Accuracy'],
+             striking['Significant Strike Accuracy'],
+             clinch['Takedown Accuracy']),)
 
-    fig.update_layout(showlegend=False,
-                      autosize=True,
-                      hoverlabel={
-                          'font': {
-                              'color': '#ffffff'
-                          }
-
-                      },
-                      margin={
-                          'pad': 0,
-                          'l': 0,
-                          'r': 0,
-                          'b': 0,
-                          't': 0,
-                      },
-                      transition={
-                          'duration': 300,
-                          'easing': 'linear'
-                      }
-
-                      )
 
-    fig.update_yaxes(
-        showgrid=False,
-        title={
-            'text': '',
-            'standoff': 0.5
-        },
-        side="right",
-        visible=False
-    )
+def plot_totals(stats):
+    return render('totals', total_values(stats))
 
-    fig.update_xaxes(
-        title={
-            'text': '',
-            'standoff': 0
-        },
-        ticksuffix="%",
-    )
 
-    return fig
+def plot_totals_reverse(stats):
+    return render('totals_reverse', total_values(stats))
 
 
 """
@@ -362,43 +271,7 @@ def plot_ratios(stats):
     sub = stats['SUB'][0]
     dec = wins - ko - sub
 
-    ratio_data = {'Method': ['Decisions', "(T)KO's", 'Submissions'],
-                  'Count': [dec, ko, sub]}
-
-    df = pd.DataFrame(ratio_data, columns=['Method', 'Count'])
-    fig = px.pie(data_frame=df,
-                 values='Count',
-                 names='Method',
-                 template='plotly_dark',
-                 color='Method',
-                 color_discrete_map={'Decisions': '#4ACFAC',
-                                     "(T)KO's": '#F9AA33',
-                                     'Submissions': '#BB86FC'}
-                 )
-
-    fig.update_traces(textposition='inside',
-                      textinfo='label+percent',
-                      textfont={'size': 40},
-                      hovertemplate=('<b>%{label}</b><br> Percent: %{percent}'
-                                     '<br> Count: %{value}')
-                      )
-    fig.update_layout(showlegend=False,
-                      autosize=True,
-                      margin={
-                          'pad': 0,
-                          'l': 0,
-                          'r': 0,
-                          'b': 0,
-                          't': 0,
-                      },
-                      transition={
-                          'duration': 300,
-                          'easing': 'linear'
-                      }
-
-                      )
-
-    return fig
+    return render('ratios', ((dec, ko, sub),))
 
 
 def main():
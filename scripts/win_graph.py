@@ -0,0 +1,211 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+from array import array
+
+from scripts.name_index import NodeIndex
+
+
+class WinGraph:
+    """
+    Win graph held in memory as CSR style adjacency arrays.
+    Fighter i beat every fighter in targets[offsets[i]:offsets[i + 1]]
+    and lost to every fighter in loss_targets[loss_offsets[i]:...]
+
+    All four arrays live in the csr tuple so patch can swap them in one
+    assignment while searches hold on to the previous version.
+
+    Every listed fighter is its own node keyed by ESPN id, so fighters
+    sharing a name are never merged. espn_ids[f_id] is the ESPN id of
+    node f_id, opponents who aren't listed come last and have none.
+    Names are only used at the edges and resolve through a NodeIndex,
+    so opponents spelled differently in a record still point at the
+    fighter's node
+    """
+
+    def __init__(self, names, offsets, targets, loss_count,
+                 loss_offsets=None, loss_targets=None, espn_ids=None):
+        self.names = names
+        self.name_ids = NodeIndex(names)
+        self.espn_ids = array('l') if espn_ids is None else espn_ids
+        self.nodes = {espn_id: f_id
+                      for f_id, espn_id in enumerate(self.espn_ids)}
+
+        self.loss_count = loss_count
+        self.version = 0
+        self.landmarks = None
+        self.components = None
+        self.trees = None
+
+        if loss_offsets is None:
+            loss_offsets, loss_targets = reverse_edges(offsets, targets)
+
+        self.csr = (offsets, targets, loss_offsets, loss_targets)
+
+    @property
+    def offsets(self):
+        return self.csr[0]
+
+    @property
+    def targets(self):
+        return self.csr[1]
+
+    @property
+    def loss_offsets(self):
+        return self.csr[2]
+
+    @property
+    def loss_targets(self):
+        return self.csr[3]
+
+    def __len__(self):
+        return len(self.names)
+
+    def fighter_id(self, name):
+        return self.name_ids.get(name)
+
+    def node(self, fighter):
+        """
+        :param fighter: ESPN id, or a name for fighters without one
+        :return int: Node id, None if unknown
+        """
+        if isinstance(fighter, int):
+            return self.nodes.get(fighter)
+        return self.fighter_id(fighter)
+
+    def fighter(self, f_id):
+        """
+        :param int f_id: Node id
+        :return: ESPN id of the node, its name for opponents without one
+        """
+        if f_id < len(self.espn_ids):
+            return self.espn_ids[f_id]
+        return self.names[f_id]
+
+    def wins(self, f_id):
+        offsets, targets = self.csr[:2]
+        return targets[offsets[f_id]:offsets[f_id + 1]]
+
+    def losses(self, f_id):
+        loss_offsets, loss_targets = self.csr[2:]
+        return loss_targets[loss_offsets[f_id]:loss_offsets[f_id + 1]]
+
+    def intern(self, name):
+        return self.name_ids.intern(name)
+
+    def patch(self, records):
+        """
+        Replace the records of some fighters in place instead of
+        reloading the whole graph. Listed fighters missing from the graph
+        are skipped, they are added when the graph is next built
+        :param dict records: ESPN id, or name for fighters without one,
+                             to list of (opponent, result)
+        """
+        updates = {}
+        for fighter, record in records.items():
+            if isinstance(fighter, int):
+                f_id = self.nodes.get(fighter)
+            else:
+                f_id = self.intern(fighter)
+
+            if f_id is None:
+                continue
+
+            # Every opponent gets a node, as when the graph is built
+            fights = [(self.intern(opponent), res) for opponent, res in record]
+            wins = array('l', [op_id for op_id, res in fights if res == 'W'])
+            losses = sum(1 for opponent, res in record if res != 'W')
+            updates[f_id] = (wins, losses)
+
+        old_offsets, old_targets = self.csr[:2]
+        old_size = len(old_offsets) - 1
+
+        offsets = array('l', [0])
+        targets = array('l')
+        loss_count = array('l', self.loss_count)
+        loss_count.extend([0] * (len(self.names) - len(loss_count)))
+
+        for f_id in range(len(self.names)):
+            if f_id in updates:
+                targets.extend(updates[f_id][0])
+                loss_count[f_id] = updates[f_id][1]
+            elif f_id < old_size:
+                targets.extend(old_targets[old_offsets[f_id]:
+                                           old_offsets[f_id + 1]])
+            offsets.append(len(targets))
+
+        self.loss_count = loss_count
+        self.csr = (offsets, targets) + reverse_edges(offsets, targets)
+        self.version += 1
+
+    def has_losses(self, f_id):
+        return self.loss_count[f_id] > 0
+
+    @classmethod
+    def from_records(cls, name_index):
+        """
+        Load every fighter record once into memory
+        :param NameIndex name_index: Index of fighters with records
+        :return: WinGraph
+        """
+        names = [entry[0] for entry in name_index.fighters.values()]
+        records = name_index.fighter_files()
+        name_ids = NodeIndex(names)
+
+        offsets = array('l', [0])
+        targets = array('l')
+        loss_count = array('l', [0]) * len(records)
+
+        for f_id, fight_file in enumerate(records):
+            try:
+                with open(fight_file, 'r', encoding='utf-8') as file:
+                    for line in file:
+                        opponent, res = line.rstrip('\n').split('\t')[:2]
+                        op_id = name_ids.intern(opponent)
+
+                        if res == 'W':
+                            targets.append(op_id)
+                        else:
+                            loss_count[f_id] += 1
+
+            except (FileNotFoundError, TypeError, ValueError):
+                pass
+
+            offsets.append(len(targets))
+
+        # Opponents without a record of their own have no wins
+        offsets.extend([len(targets)] * (len(names) - len(records)))
+        loss_count.extend([0] * (len(names) - len(records)))
+
+        return cls(names, offsets, targets, loss_count,
+                   espn_ids=array('l', name_index.fighters))
+
+
+def reverse_edges(offsets, targets):
+    """
+    Transpose CSR win edges into loss edges so searching backward from
+    a fighter walks exactly the wins a forward search would
+    :param array offsets: Win offsets
+    :param array targets: Win targets
+    :return tuple: Loss offsets and loss targets
+    """
+    size = len(offsets) - 1
+    loss_offsets = array('l', [0]) * (size + 1)
+
+    for opponent in targets:
+        loss_offsets[opponent + 1] += 1
+
+    for f_id in range(size):
+        loss_offsets[f_id + 1] += loss_offsets[f_id]
+
+    fill = loss_offsets[:-1]
+    loss_targets = array('l', [0]) * len(targets)
+
+    for winner in range(size):
+        for opponent in targets[offsets[winner]:offsets[winner + 1]]:
+            loss_targets[fill[opponent]] = winner
+            fill[opponent] += 1
+
+    return loss_offsets, loss_targets
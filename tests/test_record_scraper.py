@@ -0,0 +1,68 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from scripts.name_index import NameIndex
+
+record_scraper = pytest.importorskip('scrapers.record_scraper')
+
+FIGHTERS = [('Niina Aaltonen', 'niina-aaltonen', 3043549),
+            ('Miguel Torres', 'miguel-torres', 2),
+            ('Jeremy Horn', 'jeremy-horn', 3)]
+
+
+class PatchedGraph:
+    def __init__(self):
+        self.changed = {}
+
+    def patch(self, changed):
+        self.changed.update(changed)
+
+
+@pytest.fixture
+def refresh(tmp_path, monkeypatch):
+    name_urls = tmp_path / "name_url.tsv"
+    name_urls.write_text(''.join(
+        f"{name}\thttp://www.espn.com/mma/fighter/_/id/{espn_id}/{slug}\n"
+        for name, slug, espn_id in FIGHTERS))
+
+    monkeypatch.setattr(record_scraper, 'NameIndex', SimpleNamespace(
+        from_file=lambda names: NameIndex.from_file(names, tmp_path)))
+    monkeypatch.setattr(record_scraper, 'STORE_FILE', tmp_path / "none.bin")
+    monkeypatch.setattr(record_scraper, 'make_session',
+                        lambda workers: None)
+
+    def run(failing):
+        def refresh_record(link, session, limiter, retries):
+            if link in failing:
+                raise KeyError('Opponent')
+            content = "Jeremy Horn\tW\n"
+            return content, record_scraper.hashlib.sha1(
+                content.encode('utf-8')).hexdigest()
+
+        monkeypatch.setattr(record_scraper, 'refresh_record', refresh_record)
+        graph = PatchedGraph()
+        changed = record_scraper.refresh_records(
+            name_urls, tmp_path / "manifest.tsv", max_age=0, workers=1,
+            graph=graph)
+        return changed, graph
+
+    return run
+
+
+def test_failed_fighter_doesnt_stop_refresh(refresh, capsys):
+    failing = {"http://www.espn.com/mma/fighter/_/id/2/miguel-torres"}
+
+    changed, graph = refresh(failing)
+    assert sorted(changed) == [3, 3043549]
+    assert sorted(graph.changed) == [3, 3043549]
+
+    # The failed fighter is still new to the manifest on the next run
+    changed, graph = refresh(set())
+    assert changed == [2]
+    assert list(graph.changed) == [2]
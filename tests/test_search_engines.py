@@ -0,0 +1,235 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+import random
+from array import array
+from collections import deque
+
+import pytest
+
+from scripts.components import ComponentIndex, component_index
+from scripts.landmarks import build_landmarks, load_landmarks, \
+    write_landmarks
+from scripts.path_finder import SEARCH_ENGINES, get_path, search_graph
+from scripts.tree_cache import TreeCache
+from scripts.win_graph import WinGraph
+
+ENGINES = ['bidirectional', 'matrix', 'pruned', 'component', 'landmark',
+           'tree', 'cached']
+
+
+def make_graph(size=400, clusters=4, edges=3, seed=0):
+    """
+    Seeded synthetic win graph. Wins only go from a cluster to itself or
+    the next one, so later clusters can never reach earlier ones, and
+    the last fighter of every cluster never loses
+    :return: WinGraph
+    """
+    rand = random.Random(seed)
+    per_cluster = size // clusters
+    wins = [set() for _ in range(size)]
+
+    for f_id in range(size):
+        cluster = f_id // per_cluster
+
+        for _ in range(edges):
+            target = cluster + (rand.random() < 0.1)
+            if target >= clusters:
+                continue
+
+            opponent = target * per_cluster + rand.randrange(per_cluster - 1)
+            if opponent != f_id:
+                wins[f_id].add(opponent)
+
+    offsets = array('l', [0])
+    targets = array('l')
+    loss_count = array('l', [0]) * size
+
+    for f_id in range(size):
+        for opponent in sorted(wins[f_id]):
+            targets.append(opponent)
+            loss_count[opponent] += 1
+        offsets.append(len(targets))
+
+    graph = WinGraph([f"Fighter {f_id}" for f_id in range(size)],
+                     offsets, targets, loss_count)
+    graph.landmarks = build_landmarks(graph, 4)
+    graph.trees = TreeCache()
+    return graph
+
+
+def bfs_dist(graph, a_id):
+    dist = {a_id: 0}
+    to_add = deque([a_id])
+
+    while len(to_add) > 0:
+        f_id = to_add.popleft()
+        for opponent in graph.wins(f_id):
+            if opponent not in dist:
+                dist[opponent] = dist[f_id] + 1
+                to_add.append(opponent)
+
+    return dist
+
+
+def needs(engine):
+    # The matrix engine is the only one built on NumPy
+    if engine == 'matrix':
+        pytest.importorskip('numpy')
+
+
+def find_path(graph, a_id, b_id, engine):
+    result = search_graph(graph, a_id, b_id, engine)
+    return None if result is None else get_path(result, a_id, b_id)
+
+
+@pytest.fixture(scope='module')
+def graph():
+    return make_graph()
+
+
+@pytest.fixture(scope='module')
+def pairs(graph):
+    rand = random.Random(1)
+    return [(rand.randrange(len(graph)), rand.randrange(len(graph)))
+            for _ in range(400)]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_engines_match_forward(graph, pairs, engine, capsys):
+    needs(engine)
+
+    for a_id, b_id in pairs:
+        expected = find_path(graph, a_id, b_id, 'forward')
+        path = find_path(graph, a_id, b_id, engine)
+
+        if expected is None:
+            assert path is None, (a_id, b_id)
+            continue
+
+        assert path is not None, (a_id, b_id)
+        assert len(path) == len(expected), (a_id, b_id)
+        assert path[0] == a_id and path[-1] == b_id
+        for winner, loser in zip(path, path[1:]):
+            assert loser in graph.wins(winner)
+
+
+def test_forward_is_shortest(graph, pairs, capsys):
+    for a_id, b_id in pairs:
+        path = find_path(graph, a_id, b_id, 'forward')
+        dist = bfs_dist(graph, a_id).get(b_id)
+
+        if path is None:
+            assert dist is None or dist == 0 or not graph.has_losses(b_id)
+        else:
+            assert len(path) - 1 == dist
+
+
+def test_workload_covers_every_case(graph, pairs):
+    kinds = set()
+
+    for a_id, b_id in pairs:
+        if a_id == b_id:
+            continue
+        elif not graph.has_losses(b_id):
+            kinds.add('undefeated')
+        elif b_id in bfs_dist(graph, a_id):
+            kinds.add('reachable')
+        else:
+            kinds.add('unreachable')
+
+    assert kinds == {'undefeated', 'reachable', 'unreachable'}
+
+
+@pytest.mark.parametrize('engine', ['forward'] + ENGINES)
+def test_unreachable_pairs(graph, engine, capsys):
+    needs(engine)
+
+    # The first cluster can reach the last, never the other way round
+    a_id, b_id = len(graph) - 2, 0
+
+    assert graph.has_losses(b_id)
+    assert b_id not in bfs_dist(graph, a_id)
+    assert find_path(graph, a_id, b_id, engine) is None
+    assert not component_index(graph).can_reach(a_id, b_id)
+
+
+@pytest.mark.parametrize('engine', ['forward'] + ENGINES)
+def test_undefeated_target(graph, engine, capsys):
+    needs(engine)
+
+    undefeated = [f_id for f_id in range(len(graph))
+                  if not graph.has_losses(f_id)]
+    assert len(undefeated) > 0
+
+    for b_id in undefeated:
+        assert find_path(graph, 0, b_id, engine) is None
+
+
+def test_landmark_bounds(graph):
+    index = graph.landmarks
+
+    for a_id in range(0, len(graph), 7):
+        dist = bfs_dist(graph, a_id)
+
+        for b_id in range(0, len(graph), 5):
+            lower = index.lower_bound(a_id, b_id)
+            upper = index.upper_bound(a_id, b_id)[0]
+
+            if b_id in dist:
+                assert lower <= dist[b_id] <= upper
+            else:
+                assert upper > len(graph)
+
+
+def test_component_index_matches_graph(graph):
+    index = component_index(graph)
+
+    assert isinstance(index, ComponentIndex)
+    assert index.matches(graph)
+
+    for a_id in range(0, len(graph), 11):
+        reached = bfs_dist(graph, a_id)
+        for b_id in range(len(graph)):
+            if b_id in reached:
+                assert index.can_reach(a_id, b_id)
+
+
+def test_stale_landmarks_rejected(graph, tmp_path):
+    landmark_file = tmp_path / "landmarks.bin"
+    write_landmarks(graph.landmarks, landmark_file)
+    assert load_landmarks(graph, landmark_file) is not None
+
+    # Same number of fighters and fights, one win credited elsewhere
+    offsets, targets = array('l', graph.offsets), array('l', graph.targets)
+    targets[0] = next(f_id for f_id in range(len(graph))
+                      if f_id not in graph.wins(0) and f_id != 0)
+    changed = WinGraph(list(graph.names), offsets, targets, graph.loss_count)
+
+    assert load_landmarks(changed, landmark_file) is None
+
+
+def test_tree_engine_can_be_cancelled(graph, capsys):
+    class Stop(Exception):
+        pass
+
+    calls = []
+
+    def check():
+        calls.append(1)
+        if len(calls) > 2:
+            raise Stop
+
+    graph.trees = TreeCache()
+    b_id = next(f_id for f_id in range(1, len(graph))
+                if graph.has_losses(f_id))
+
+    with pytest.raises(Stop):
+        search_graph(graph, 0, b_id, 'tree', check=check)
+    assert len(graph.trees) == 0
+
+
+def test_engines_registered():
+    assert set(ENGINES) <= set(SEARCH_ENGINES)
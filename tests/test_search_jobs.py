@@ -0,0 +1,37 @@
+"""
+Author: Aaron Ho
+Python Version: 3.7
+"""
+
+from scripts.search_jobs import JobManager
+
+
+def search(a, b, check=None, progress=None):
+    check()
+    return a + b
+
+
+def test_job_ids_differ_between_managers():
+    first, second = JobManager(workers=1), JobManager(workers=1)
+    job_id = first.submit(search, 1, 2)
+    other_id = second.submit(search, 1, 2)
+
+    assert job_id != other_id
+    assert second.status(job_id) == 'missing'
+
+    first.jobs[job_id].future.result()
+    assert first.status(job_id) == 'done'
+    assert first.result(job_id) == 3
+
+
+def test_matching_searches_share_a_job():
+    jobs = JobManager(workers=1)
+    job_id = jobs.submit(search, 1, 2)
+    rider_id = jobs.submit(search, 1, 2)
+
+    jobs.jobs[job_id].future.result()
+    assert jobs.result(rider_id) == 3
+
+    jobs.cancel(job_id)
+    assert jobs.status(job_id) == 'missing'
+    assert jobs.status(rider_id) == 'done'